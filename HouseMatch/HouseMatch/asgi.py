@@ -2,6 +2,8 @@
 ASGI config for HouseMatch project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Production runs it with ``gunicorn -k uvicorn_worker.UvicornWorker`` so the
+streaming ACM view (async) does not hold a worker while the LLM answers.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -4,6 +4,7 @@ from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from .models import (
     Departamento,
     Empresa,
+    EstadisticaZona,
     Etiqueta,
     ImagenInmueble,
     Inmueble,
@@ -131,3 +132,13 @@ class InmuebleGuardadoAdmin(admin.ModelAdmin):
     list_display = ("id", "etiqueta", "inmueble", "guardado_en")
     list_filter = ("etiqueta__usuario",)
     search_fields = ("etiqueta__nombre", "inmueble__titulo")
+
+
+@admin.register(EstadisticaZona)
+class EstadisticaZonaAdmin(admin.ModelAdmin):
+    list_display = (
+        "periodo", "ciudad", "zona", "tipo_propiedad", "tipo_transaccion",
+        "cantidad", "mediana_m2", "tendencia_pct",
+    )
+    list_filter = ("periodo", "tipo_propiedad", "tipo_transaccion", "ciudad")
+    search_fields = ("ciudad", "zona")
@@ -1,15 +1,46 @@
+import hashlib
+import math
+
 from django.contrib.auth import authenticate
 from django.core.cache import cache
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
 from rest_framework import generics, permissions, status
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-MAPA_CACHE_KEY = 'mapa_geojson'
-MAPA_CACHE_TTL = 60  # segundos
-
-from .models import Etiqueta, Inmueble, InmuebleGuardado
-from .serializers import InmuebleCreateSerializer
+from . import catalogo, estadisticas
+from .espacial import cercanos, en_radio
+from .ingesta import INGESTA_LOTE_MAX, desactivar_faltantes, ingestar_lote
+from .mapa import (
+    DETALLE_IDS_MAX,
+    ID_MAX,
+    MAPA_BBOX_LIMITE,
+    MAPA_CACHE_TTL,
+    MAPA_CLUSTER_ZOOM_MAX,
+    MAPA_STALE_TTL,
+    MAPA_VISTAS,
+    MAPA_ZOOM_MAX,
+    a_columnar,
+    clusters_por_zoom,
+    codificar_payload,
+    detalle_queryset,
+    elegir_codificacion,
+    features_mapa,
+    inmueble_feature,
+    obtener_payload,
+    version_mapa,
+)
+from .models import Etiqueta, Inmueble, InmuebleGuardado, TipoPropiedad, TipoTransaccion
+from .renderers import ColumnarJSONRenderer
+from .serializers import EstadisticaZonaSerializer, InmuebleCreateSerializer
 
 
 class ObtenerTokenView(APIView):
@@ -32,74 +63,473 @@ class InmuebleCreateAPIView(generics.CreateAPIView):
     serializer_class = InmuebleCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def perform_create(self, serializer):
-        serializer.save()
-        try:
-            cache.delete(MAPA_CACHE_KEY)
-        except Exception:
-            pass
+
+class InmuebleLoteAPIView(APIView):
+    """
+    Alta masiva para el scraper: recibe una lista de inmuebles (mismo formato
+    que ``POST /api/inmuebles/``, con catálogos por nombre) de hasta
+    ``INGESTA_LOTE_MAX`` filas, o ``{"inmuebles": [...], "modo": "upsert"}``.
+
+    En modo upsert cada fila debe traer ``fuente`` e ``id_externo``: las ya
+    conocidas se actualizan solo si su contenido cambió. Las filas inválidas
+    se devuelven en ``errores`` con su índice. Responde 201 si se creó algo,
+    200 si solo hubo actualizaciones o filas sin cambios y 400 si ninguna
+    fila fue válida.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        filas, modo = request.data, "crear"
+        if isinstance(filas, dict):
+            filas, modo = filas.get("inmuebles"), filas.get("modo", modo)
+        if modo not in ("crear", "upsert"):
+            raise ValidationError({"modo": "Valores válidos: crear, upsert"})
+        if not isinstance(filas, list) or not all(isinstance(f, dict) for f in filas):
+            raise ValidationError({"inmuebles": "Se espera una lista de objetos."})
+        if not filas:
+            raise ValidationError({"inmuebles": "La lista está vacía."})
+        if len(filas) > INGESTA_LOTE_MAX:
+            raise ValidationError({"inmuebles": f"Máximo {INGESTA_LOTE_MAX} por lote."})
+
+        resultado = ingestar_lote(filas, upsert=modo == "upsert")
+        if resultado["creados"]:
+            codigo = status.HTTP_201_CREATED
+        elif resultado["actualizados"] or resultado["sin_cambios"]:
+            codigo = status.HTTP_200_OK
+        else:
+            codigo = status.HTTP_400_BAD_REQUEST
+        return Response(resultado, status=codigo)
+
+
+class InmuebleLoteDesactivarAPIView(APIView):
+    """
+    Cierre de un crawl completo: ``{"fuente": "c21", "desde": <ISO 8601>}``
+    da de baja (``activo=False``) los inmuebles de esa fuente que no llegaron
+    en ningún lote desde ``desde`` (el inicio del crawl).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        fuente = request.data.get("fuente")
+        desde = parse_datetime(str(request.data.get("desde", "")))
+        if not fuente:
+            raise ValidationError({"fuente": "Requerido."})
+        if desde is None:
+            raise ValidationError({"desde": "Fecha ISO 8601 requerida."})
+        return Response({"desactivados": desactivar_faltantes(fuente, desde)})
+
+
+def _parse_zoom(request):
+    zoom = request.query_params.get("zoom")
+    if zoom is None:
+        return None
+    try:
+        zoom = int(zoom)
+    except ValueError:
+        raise ValidationError({"zoom": "Debe ser un entero."})
+    if not (0 <= zoom <= MAPA_ZOOM_MAX):
+        raise ValidationError({"zoom": f"Debe estar entre 0 y {MAPA_ZOOM_MAX}."})
+    return zoom
+
+
+def _parse_bbox(request, zoom=None):
+    """
+    Lee ?bbox=oeste,sur,este,norte. Devuelve la tupla o None si no se envió.
+    Exige zoom: el bbox se ajusta hacia afuera a la grilla de tiles de ese
+    zoom, así los paneos pequeños comparten la misma clave de caché en vez de
+    crear una por cada viewport exacto.
+    """
+    raw = request.query_params.get("bbox")
+    if not raw:
+        return None
+    try:
+        oeste, sur, este, norte = (float(v) for v in raw.split(","))
+    except ValueError:
+        raise ValidationError({"bbox": "Formato esperado: oeste,sur,este,norte"})
+    if not (-180 <= oeste < este <= 180 and -90 <= sur < norte <= 90):
+        raise ValidationError({"bbox": "Coordenadas fuera de rango o invertidas."})
+    if zoom is None:
+        raise ValidationError({"zoom": "Requerido con bbox."})
+
+    celda = 360 / (2 ** zoom)
+    oeste = max(-180.0, math.floor(oeste / celda) * celda)
+    sur = max(-90.0, math.floor(sur / celda) * celda)
+    este = min(180.0, math.ceil(este / celda) * celda)
+    norte = min(90.0, math.ceil(norte / celda) * celda)
+    return oeste, sur, este, norte
+
+
+def _parse_vista(request):
+    vista = request.query_params.get("vista", "completa")
+    if vista not in MAPA_VISTAS:
+        raise ValidationError({"vista": f"Valores válidos: {', '.join(MAPA_VISTAS)}"})
+    return vista
 
 
 class InmuebleMapGeoJSONAPIView(APIView):
+    """
+    GeoJSON de inmuebles activos para el mapa.
+
+    Sin parámetros devuelve los últimos 1000 inmuebles. Con
+    ``?bbox=oeste,sur,este,norte&zoom=N`` devuelve solo
+    los que caen dentro del viewport, hasta ``MAPA_BBOX_LIMITE``; si hay más se
+    marca ``truncado: true``.
+
+    Con ``?modo=clusters&zoom=N`` y zoom <= ``MAPA_CLUSTER_ZOOM_MAX`` devuelve
+    clusters precalculados (conteo, centroide y precios) en lugar de puntos;
+    con zoom mayor vuelve a los puntos individuales.
+
+    Con ``?vista=marcadores`` cada punto trae solo id, precio, tipo y
+    banderas; el resto se pide a ``/api/inmuebles/detalle/?ids=...``.
+
+    Los puntos pueden pedirse en formato columnar (ver ``ColumnarJSONRenderer``);
+    los clusters salen siempre en JSON.
+
+    Las respuestas llevan ``ETag``/``Last-Modified`` derivados de
+    ``version_mapa()``; un ``If-None-Match`` vigente recibe 304 sin cuerpo.
+
+    Los puntos se cachean ya serializados y comprimidos (gzip y brotli) y se
+    devuelven tal cual según ``Accept-Encoding``, sin pasar por el renderer.
+    La regeneración pasa por ``obtener_payload``: un solo worker reconstruye
+    mientras el resto sirve la copia anterior con su propio ETag.
+    """
+
     permission_classes = [permissions.AllowAny]
+    renderer_classes = [JSONRenderer, ColumnarJSONRenderer]
 
     def get(self, request):
-        try:
-            data = cache.get(MAPA_CACHE_KEY)
-        except Exception:
-            data = None
-        if data is None:
-            inmuebles = (
-                Inmueble.objects.filter(activo=True, latitud__isnull=False, longitud__isnull=False)
-                .select_related("tipo_propiedad", "tipo_transaccion", "departamento")
-                .prefetch_related("imagenes")
-                .order_by("-id")[:1000]
-            )
-
-            features = []
-            for inmueble in inmuebles:
-                imagenes_list = list(inmueble.imagenes.all())
-                features.append(
-                    {
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Point",
-                            "coordinates": [float(inmueble.longitud), float(inmueble.latitud)],
-                        },
-                        "properties": {
-                            "id": inmueble.id,
-                            "titulo": inmueble.titulo,
-                            "precio_usd": str(inmueble.precio_usd),
-                            "precio_bs": str(inmueble.precio_bs),
-                            "ciudad": inmueble.ciudad,
-                            "zona": inmueble.zona,
-                            "calle": inmueble.calle,
-                            "cant_cuartos": inmueble.cant_cuartos,
-                            "cant_banios": inmueble.cant_banios,
-                            "piscina": inmueble.piscina,
-                            "parqueo": inmueble.parqueo,
-                            "permite_mascotas": inmueble.permite_mascotas,
-                            "imagen_principal": imagenes_list[0].url if imagenes_list else None,
-                            "imagenes": [img.url for img in imagenes_list],
-                            "url_propiedad": inmueble.url_propiedad,
-                            "area_construida": str(inmueble.area_construida),
-                            "area_terreno": str(inmueble.area_terreno),
-                            "tipo_propiedad": inmueble.tipo_propiedad.nombre,
-                            "tipo_transaccion": inmueble.tipo_transaccion.nombre,
-                            "departamento": inmueble.departamento.nombre,
-                            "nombre_captador": inmueble.nombre_captador,
-                            "celular_captacion": inmueble.celular_captacion,
-                        },
-                    }
+        version = version_mapa()
+        response = get_conditional_response(
+            request, etag=self._etag(request, version), last_modified=version["modificado"]
+        )
+        if response is None:
+            # Puede servirse una copia de una versión anterior: el ETag y
+            # Last-Modified deben corresponder a lo que realmente se envía.
+            actual = version
+            response, version = self._get(request, actual)
+            if version["token"] != actual["token"]:
+                response = get_conditional_response(
+                    request, etag=self._etag(request, version),
+                    last_modified=version["modificado"], response=response,
                 )
+        response["ETag"] = self._etag(request, version)
+        response["Last-Modified"] = http_date(version["modificado"])
+        response["Cache-Control"] = "no-cache"
+        patch_vary_headers(response, ["Accept"])
+        return response
+
+    def _etag(self, request, version):
+        # El ETag depende de la representación: misma versión pero distinta
+        # URL (bbox, vista, modo) o formato negociado es otro recurso.
+        return quote_etag(hashlib.md5(
+            f"{version['token']}|{request.get_full_path()}|{request.accepted_media_type}".encode()
+        ).hexdigest())
+
+    def _get(self, request, version):
+        zoom = _parse_zoom(request)
+        bbox = _parse_bbox(request, zoom)
+        vista = _parse_vista(request)
+
+        if request.query_params.get("modo") == "clusters":
+            if zoom is None:
+                raise ValidationError({"zoom": "Requerido en modo clusters."})
+            if zoom <= MAPA_CLUSTER_ZOOM_MAX:
+                # Los clusters no tienen variante columnar: siempre van en JSON.
+                request.accepted_renderer = JSONRenderer()
+                request.accepted_media_type = JSONRenderer.media_type
+                return Response(self._get_clusters(bbox, zoom, version)), version
+
+        base_key, queryset, feature = MAPA_VISTAS[vista]
+        if bbox is None:
+            cache_key = base_key
+            construir = lambda: {"type": "FeatureCollection", "features": features_mapa(vista)}
+        else:
+            oeste, sur, este, norte = bbox
+            # Una clave por versión y sin copia vieja: hay demasiados viewports
+            # como para conservar cada uno durante MAPA_STALE_TTL.
+            cache_key = f"{base_key}:bbox:{version['token']}:{zoom}:{oeste}:{sur}:{este}:{norte}"
+            construir = lambda: self._datos_bbox(queryset, feature, bbox, zoom)
+            return self._respuesta_codificada(request, cache_key, version, construir, ttl=MAPA_CACHE_TTL)
+        return self._respuesta_codificada(request, cache_key, version, construir)
+
+    def _respuesta_codificada(self, request, cache_key, version, construir, ttl=MAPA_STALE_TTL):
+        renderer = request.accepted_renderer
+
+        def codificar():
+            data = construir()
+            if renderer.format == ColumnarJSONRenderer.format:
+                data = a_columnar(data)
+            return codificar_payload(renderer.render(data))
+
+        entrada = obtener_payload(f"{cache_key}:{renderer.format}", version, codificar, ttl)
+        payload = entrada["payload"]
+        codificacion = elegir_codificacion(request.META.get("HTTP_ACCEPT_ENCODING", ""), payload)
+        response = HttpResponse(payload[codificacion], content_type=renderer.media_type)
+        if codificacion != "identity":
+            response["Content-Encoding"] = codificacion
+        response["Content-Length"] = len(payload[codificacion])
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response, entrada["version"]
+
+    def _get_clusters(self, bbox, zoom, version):
+        features = clusters_por_zoom(zoom, version)
+        if bbox is not None:
+            oeste, sur, este, norte = bbox
+            features = [
+                f for f in features
+                if oeste <= f["geometry"]["coordinates"][0] <= este
+                and sur <= f["geometry"]["coordinates"][1] <= norte
+            ]
+        return {
+            "type": "FeatureCollection",
+            "agrupado": True,
+            "zoom": zoom,
+            "features": features,
+        }
+
+    def _datos_bbox(self, queryset, feature, bbox, zoom):
+        oeste, sur, este, norte = bbox
+        filas = list(
+            queryset()
+            .filter(latitud__range=(sur, norte), longitud__range=(oeste, este))
+            .order_by("-id")[:MAPA_BBOX_LIMITE + 1]
+        )
+        return {
+            "type": "FeatureCollection",
+            "bbox": [oeste, sur, este, norte],
+            "zoom": zoom,
+            "truncado": len(filas) > MAPA_BBOX_LIMITE,
+            "features": [feature(fila) for fila in filas[:MAPA_BBOX_LIMITE]],
+        }
+
+
+class InmuebleDetalleAPIView(APIView):
+    """
+    Datos completos de tarjeta para los inmuebles pedidos en
+    ``?ids=1,2,3`` (máximo ``DETALLE_IDS_MAX``), en el mismo orden.
+    Complementa la vista de marcadores del mapa.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        raw = request.query_params.get("ids", "")
+        try:
+            ids = list(dict.fromkeys(int(v) for v in raw.split(",") if v.strip()))
+        except ValueError:
+            raise ValidationError({"ids": "Lista de enteros separados por coma."})
+        if any(not 1 <= pk <= ID_MAX for pk in ids):
+            raise ValidationError({"ids": f"Los ids van de 1 a {ID_MAX}."})
+        if not ids:
+            raise ValidationError({"ids": "Requerido."})
+        if len(ids) > DETALLE_IDS_MAX:
+            raise ValidationError({"ids": f"Máximo {DETALLE_IDS_MAX} ids por pedido."})
+
+        inmuebles = detalle_queryset().filter(
+            pk__in=ids, activo=True, latitud__isnull=False, longitud__isnull=False
+        ).in_bulk()
+        features = [inmueble_feature(inmuebles[pk]) for pk in ids if pk in inmuebles]
+        return Response({"type": "FeatureCollection", "features": features})
+
+
+# Claves de tipo_transaccion que envía mapa.html y el fragmento de nombre que
+# las identifica en el catálogo (sin tilde, "Anticrético" también coincide).
+TRANSACCION_PATRONES = {
+    "alquiler": "alquiler",
+    "venta": "venta",
+    "anticretico": "anticr",
+}
+BUSQUEDA_CAMPOS_TEXTO = ("titulo", "zona", "ciudad", "calle")
+BUSQUEDA_RADIO_MAX = 50000  # metros
+CERCANOS_K_DEFECTO = 10
+CERCANOS_K_MAX = 100
+
+
+class BusquedaPagination(PageNumberPagination):
+    page_size = 200
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def get_paginated_response(self, data):
+        return Response({
+            "type": "FeatureCollection",
+            "count": self.page.paginator.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "features": data,
+        })
+
+
+def _param_numero(params, nombre, tipo=float):
+    valor = params.get(nombre)
+    if valor in (None, ""):
+        return None
+    try:
+        numero = tipo(valor)
+    except ValueError:
+        raise ValidationError({nombre: "Debe ser numérico."})
+    if not math.isfinite(numero):  # float() acepta "nan" e "inf"
+        raise ValidationError({nombre: "Debe ser un número finito."})
+    return numero
+
+
+def _param_bool(params, nombre):
+    return params.get(nombre, "").lower() in ("1", "true", "si", "on")
+
+
+def _filtrar_busqueda(qs, params):
+    """Filtros compartidos por la búsqueda y los cercanos (todos salvo radio)."""
+    if "tipo_transaccion" in params:
+        # Un valor vacío significa "ninguno marcado".
+        tipos = [t for t in params.getlist("tipo_transaccion") if t]
+        desconocidos = set(tipos) - set(TRANSACCION_PATRONES)
+        if desconocidos:
+            raise ValidationError({"tipo_transaccion": f"Valores no válidos: {', '.join(sorted(desconocidos))}"})
+        for clave, patron in TRANSACCION_PATRONES.items():
+            if clave not in tipos:
+                qs = qs.exclude(tipo_transaccion__nombre__icontains=patron)
+
+    precio_min = _param_numero(params, "precio_min")
+    if precio_min is not None:
+        qs = qs.filter(precio_usd__gte=precio_min)
+    precio_max = _param_numero(params, "precio_max")
+    if precio_max is not None:
+        qs = qs.filter(precio_usd__lte=precio_max)
+
+    min_cuartos = _param_numero(params, "min_cuartos", int)
+    if min_cuartos:
+        qs = qs.filter(cant_cuartos__gte=min_cuartos)
+    min_banios = _param_numero(params, "min_banios", int)
+    if min_banios:
+        qs = qs.filter(cant_banios__gte=min_banios)
+
+    if _param_bool(params, "piscina"):
+        qs = qs.filter(piscina=True)
+    if _param_bool(params, "parqueo"):
+        qs = qs.filter(parqueo=True)
+    if _param_bool(params, "mascotas"):
+        qs = qs.filter(permite_mascotas=True)
+
+    for palabra in params.get("q", "").split():
+        coincide = Q()
+        for campo in BUSQUEDA_CAMPOS_TEXTO:
+            coincide |= Q(**{f"{campo}__icontains": palabra})
+        qs = qs.filter(coincide)
+    return qs
+
+
+def _param_punto(params):
+    lat = _param_numero(params, "lat")
+    lng = _param_numero(params, "lng")
+    if lat is None or lng is None:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValidationError({"lat": "Coordenadas fuera de rango."})
+    return lat, lng
+
+
+def _feature_con_distancia(feature, fila):
+    f = feature(fila)
+    distancia = fila["distancia_m"] if isinstance(fila, dict) else fila.distancia_m
+    f["properties"]["distancia_m"] = round(distancia)
+    return f
+
+
+class InmuebleBuscarAPIView(APIView):
+    """
+    Búsqueda paginada de inmuebles activos con los mismos filtros del mapa:
+    ``q`` (cada palabra en titulo/zona/ciudad/calle), ``precio_min``,
+    ``precio_max``, ``tipo_transaccion`` (repetible: alquiler, venta,
+    anticretico), ``min_cuartos``, ``min_banios``, ``piscina``, ``parqueo``,
+    ``mascotas`` y radio (``lat``, ``lng``, ``radio`` en metros, por el
+    índice espacial de ``home.espacial``; cada feature trae ``distancia_m``).
+    Acepta ``vista=marcadores`` igual que el endpoint del mapa.
+    """
+
+    permission_classes = [permissions.AllowAny]
+    pagination_class = BusquedaPagination
 
-            data = {"type": "FeatureCollection", "features": features}
-            try:
-                cache.set(MAPA_CACHE_KEY, data, MAPA_CACHE_TTL)
-            except Exception:
-                pass
+    def get(self, request):
+        params = request.query_params
+        _, queryset, feature = MAPA_VISTAS[_parse_vista(request)]
+        qs = _filtrar_busqueda(queryset(), params)
+
+        punto = _param_punto(params)
+        radio = _param_numero(params, "radio")
+        if radio is not None:
+            if punto is None:
+                raise ValidationError({"radio": "Requiere lat y lng."})
+            if not (0 < radio <= BUSQUEDA_RADIO_MAX):
+                raise ValidationError({"radio": f"Debe estar entre 0 y {BUSQUEDA_RADIO_MAX} metros."})
+            qs = en_radio(qs, *punto, radio)
+        else:
+            qs = qs.order_by("-id")
+
+        paginator = self.pagination_class()
+        pagina = paginator.paginate_queryset(qs, request, view=self)
+        if radio is not None:
+            features = [_feature_con_distancia(feature, fila) for fila in pagina]
+        else:
+            features = [feature(fila) for fila in pagina]
+        return paginator.get_paginated_response(features)
+
+
+class InmuebleCercanosAPIView(APIView):
+    """
+    Los ``k`` inmuebles activos más cercanos a (``lat``, ``lng``), ordenados
+    por distancia, con ``distancia_m`` en cada feature. Acepta los filtros de
+    la búsqueda, ``vista`` y ``radio_max`` (metros, tope de la búsqueda).
+    """
 
-        return Response(data)
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        params = request.query_params
+        _, queryset, feature = MAPA_VISTAS[_parse_vista(request)]
+        punto = _param_punto(params)
+        if punto is None:
+            raise ValidationError({"lat": "lat y lng son requeridos."})
+        k = _param_numero(params, "k", int)
+        k = CERCANOS_K_DEFECTO if k is None else k
+        if not (1 <= k <= CERCANOS_K_MAX):
+            raise ValidationError({"k": f"Debe estar entre 1 y {CERCANOS_K_MAX}."})
+        radio_max = _param_numero(params, "radio_max")
+        radio_max = BUSQUEDA_RADIO_MAX if radio_max is None else radio_max
+        if not (0 < radio_max <= BUSQUEDA_RADIO_MAX):
+            raise ValidationError({"radio_max": f"Debe estar entre 0 y {BUSQUEDA_RADIO_MAX} metros."})
+
+        filas = cercanos(_filtrar_busqueda(queryset(), params), *punto, k, radio_max)
+        return Response({
+            "type": "FeatureCollection",
+            "features": [_feature_con_distancia(feature, fila) for fila in filas],
+        })
+
+
+class EstadisticaZonaAPIView(generics.ListAPIView):
+    """
+    Estadísticas de USD/m² por zona del último mes calculado (precalculadas
+    en ``home.estadisticas``). Filtros: ``ciudad``, ``zona``,
+    ``tipo_propiedad`` y ``tipo_transaccion`` (por nombre, sin distinguir
+    mayúsculas ni tildes) y ``min_cantidad``. Ordenadas por cantidad.
+    """
+
+    permission_classes = [permissions.AllowAny]
+    serializer_class = EstadisticaZonaSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        params = self.request.query_params
+        qs = estadisticas.vigentes()
+        for campo in ("ciudad", "zona"):
+            if params.get(campo):
+                qs = qs.filter(**{f"{campo}__iexact": params[campo].strip()})
+        for campo, modelo in (("tipo_propiedad", TipoPropiedad), ("tipo_transaccion", TipoTransaccion)):
+            if params.get(campo):
+                qs = qs.filter(**{f"{campo}__in": catalogo.buscar(modelo, params[campo])})
+        min_cantidad = _param_numero(params, "min_cantidad", int)
+        if min_cantidad:
+            qs = qs.filter(cantidad__gte=min_cantidad)
+        return qs.order_by("-cantidad", "ciudad", "zona")
 
 
 class EtiquetaListCreateAPIView(generics.ListCreateAPIView):
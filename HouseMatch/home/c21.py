@@ -0,0 +1,221 @@
+"""
+Lectura de volcados de búsqueda de Century 21 (``pagina_N.json``).
+
+``iterar_resultados`` recorre ``results[]`` de un archivo sin cargarlo
+entero: lee por bloques y decodifica cada resultado con
+``JSONDecoder.raw_decode``. ``normalizar`` convierte un resultado en una
+fila con el formato de ``home.ingesta`` (catálogos por nombre). Los tipos de
+propiedad se buscan entre los existentes (``tipo_propiedad``): el import no
+crea tipos nuevos.
+"""
+import json
+import logging
+import re
+from decimal import Decimal, InvalidOperation
+
+from . import catalogo
+from .models import TipoPropiedad
+
+logger = logging.getLogger(__name__)
+
+FUENTE = "c21"
+URL_BASE = "https://c21.com.bo"
+TIPO_CAMBIO_BOB_USD = Decimal("6.96")
+BLOQUE_LECTURA = 64 * 1024
+
+TRANSACCIONES = {
+    "venta": "Venta",
+    "renta": "Alquiler",
+    "alquiler": "Alquiler",
+    "anticresis": "Anticrético",
+    "anticretico": "Anticrético",
+}
+
+# tipoPropiedad de C21 que no coincide con su nombre en el catálogo. El resto
+# se busca con "_" como espacio y en singular ("oficinas" → "Oficina").
+TIPOS_PROPIEDAD = {
+    "casa_en_condominio": "Casa",
+}
+
+_BLANCOS = re.compile(r"\s*")
+
+
+class _Lector:
+    """Buffer de texto sobre un archivo, con decodificación incremental."""
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _llenar(self):
+        bloque = self.archivo.read(BLOQUE_LECTURA)
+        if not bloque:
+            return False
+        self.buffer = self.buffer[self.pos:] + bloque
+        self.pos = 0
+        return True
+
+    def siguiente(self):
+        """Primer carácter no blanco, sin consumirlo ("" al final del archivo)."""
+        while True:
+            self.pos = _BLANCOS.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._llenar():
+                return ""
+
+    def consumir(self, esperados):
+        caracter = self.siguiente()
+        if caracter not in esperados:
+            raise ValueError(f"JSON inválido: se esperaba {esperados!r} y llegó {caracter!r}.")
+        self.pos += 1
+        return caracter
+
+    def valor(self):
+        self.siguiente()
+        while True:
+            try:
+                obj, fin = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._llenar():
+                    raise
+                continue
+            # Un número al final del buffer puede seguir en el próximo bloque.
+            if fin == len(self.buffer) and self._llenar():
+                continue
+            self.pos = fin
+            return obj
+
+
+def _items(lector):
+    lector.consumir("[")
+    if lector.siguiente() == "]":
+        lector.pos += 1
+        return
+    while True:
+        yield lector.valor()
+        if lector.consumir(",]") == "]":
+            return
+
+
+def iterar_resultados(archivo):
+    """
+    Genera los elementos de ``results`` de un volcado, uno por vez. Acepta
+    también un archivo cuyo nivel superior ya es la lista de resultados.
+    """
+    lector = _Lector(archivo)
+    if lector.siguiente() == "[":
+        yield from _items(lector)
+        return
+    lector.consumir("{")
+    if lector.siguiente() == "}":
+        return
+    while True:
+        clave = lector.valor()
+        lector.consumir(":")
+        if clave == "results":
+            yield from _items(lector)
+        else:
+            lector.valor()
+        if lector.consumir(",}") == "}":
+            return
+
+
+def _decimal(valor):
+    if valor in (None, ""):
+        return None
+    try:
+        return Decimal(str(valor))
+    except InvalidOperation:
+        return None
+
+
+def _coordenada(valor):
+    # El modelo guarda 6 decimales; C21 manda hasta 7.
+    valor = _decimal(valor)
+    return valor.quantize(Decimal("0.000001")) if valor is not None else None
+
+
+def _precio(precios, clave, moneda):
+    precio = (precios or {}).get(clave) or {}
+    if precio.get("moneda") == moneda:
+        return _decimal(precio.get("precio"))
+    return None
+
+
+def _precios(resultado):
+    """(usd, bs). Si falta una moneda se deriva de la otra con el tipo oficial."""
+    precios = resultado.get("precios")
+    usd = _precio(precios, "vista", "USD") or _precio(precios, "contrato", "USD")
+    bs = _precio(precios, "contrato", "BOB") or _precio(precios, "vista", "BOB")
+    if bs is None and resultado.get("moneda") == "BOB":
+        bs = _decimal(resultado.get("precio"))
+    if usd is None and resultado.get("moneda") == "USD":
+        usd = _decimal(resultado.get("precio"))
+    if usd is None and bs is not None:
+        usd = bs / TIPO_CAMBIO_BOB_USD
+    if bs is None and usd is not None:
+        bs = usd * TIPO_CAMBIO_BOB_USD
+    centavos = Decimal("0.01")
+    return (
+        usd.quantize(centavos) if usd is not None else None,
+        bs.quantize(centavos) if bs is not None else None,
+    )
+
+
+def tipo_propiedad(valor):
+    """
+    Nombre en ``TipoPropiedad`` del ``tipoPropiedad`` de C21, o None si no
+    hay uno (la fila queda con error en vez de crear el tipo).
+    """
+    clave = str(valor or "").strip().lower()
+    nombre = TIPOS_PROPIEDAD.get(clave) or clave.replace("_", " ")
+    encontrados = catalogo.buscar(TipoPropiedad, nombre)
+    if not encontrados and nombre.endswith("s"):
+        encontrados = catalogo.buscar(TipoPropiedad, nombre[:-1])
+    if not encontrados:
+        logger.warning("Tipo de propiedad de C21 desconocido: %r", valor)
+        return None
+    return min(encontrados, key=lambda tipo: tipo.pk).nombre
+
+
+def limpiar_texto(texto):
+    """Colapsa espacios y saltos de línea repetidos."""
+    return " ".join(str(texto or "").split())
+
+
+def normalizar(resultado):
+    """Resultado de C21 → fila de ``ingestar_lote`` con clave ``(c21, id)``."""
+    precio_usd, precio_bs = _precios(resultado)
+    operacion = str(resultado.get("tipoOperacion") or "").lower()
+    fotos = (resultado.get("fotos") or {}).get("propiedadThumbnail") or []
+    url = resultado.get("urlCorrectaPropiedad") or ""
+    return {
+        "fuente": FUENTE,
+        "id_externo": str(resultado.get("id") or ""),
+        "tipo_propiedad": tipo_propiedad(resultado.get("tipoPropiedad")),
+        "tipo_transaccion": TRANSACCIONES.get(operacion, operacion.capitalize()),
+        "departamento": resultado.get("estado") or "",
+        "nombre_captador": limpiar_texto(resultado.get("asesorNombre"))[:200],
+        "celular_captacion": limpiar_texto(resultado.get("telefono"))[:30],
+        "titulo": limpiar_texto(resultado.get("encabezado"))[:200],
+        "descripcion": limpiar_texto(resultado.get("descripcion")),
+        "cant_cuartos": resultado.get("recamaras") or 0,
+        "cant_banios": resultado.get("banos") or 0,
+        "area_construida": _decimal(resultado.get("m2C")) or Decimal("0"),
+        "area_terreno": _decimal(resultado.get("m2T")) or Decimal("0"),
+        "precio_usd": precio_usd,
+        "precio_bs": precio_bs,
+        "calle": limpiar_texto(resultado.get("calle"))[:255],
+        "zona": limpiar_texto(resultado.get("municipio"))[:100],
+        "ciudad": limpiar_texto(resultado.get("estado"))[:100],
+        "latitud": _coordenada(resultado.get("lat")),
+        "longitud": _coordenada(resultado.get("lon")),
+        "url_propiedad": URL_BASE + url if url.startswith("/") else url,
+        "parqueo": bool(resultado.get("estacionamientos")),
+        "piscina": bool(resultado.get("alberca")),
+        "permite_mascotas": bool(resultado.get("mascotas")),
+        "imagenes": [f for f in fotos if f],
+    }
@@ -0,0 +1,78 @@
+"""
+Cache en proceso de los catálogos (TipoPropiedad, TipoTransaccion,
+Departamento, Empresa): nombre → instancia.
+
+Son tablas de pocas filas que casi no cambian, así que cada proceso las
+carga enteras una vez. Las señales de ``home.signals`` invalidan la tabla
+al guardar o borrar en este proceso; ``CATALOGO_TTL`` y la recarga ante un
+nombre desconocido acotan cuánto tarda en verse un cambio hecho en otro
+(o una fila leída dentro de una transacción que después se revirtió).
+"""
+import time
+import unicodedata
+
+from .models import Empresa
+
+CATALOGO_TTL = 300  # segundos
+CATALOGO_RECARGA_MIN = 5  # segundos entre recargas por nombres desconocidos
+
+_tablas = {}  # modelo -> (cargada_en, {nombre: instancia})
+
+
+def _cargar(modelo):
+    por_nombre = {}
+    # Con nombres repetidos gana el de menor pk, como haría .first().
+    for obj in modelo.objects.order_by("-pk"):
+        por_nombre[obj.nombre] = obj
+    _tablas[modelo] = (time.monotonic(), por_nombre)
+    return _tablas[modelo]
+
+
+def _tabla(modelo):
+    entrada = _tablas.get(modelo)
+    if entrada is None or time.monotonic() - entrada[0] > CATALOGO_TTL:
+        entrada = _cargar(modelo)
+    return entrada
+
+
+def obtener(modelo, nombre, crear=False):
+    """
+    Instancia de ``modelo`` con ese ``nombre`` o None. Con ``crear`` se
+    crea si no existe (criterio de ``SlugGetOrCreateField``).
+    """
+    cargada_en, por_nombre = _tabla(modelo)
+    obj = por_nombre.get(nombre)
+    if obj is None and time.monotonic() - cargada_en > CATALOGO_RECARGA_MIN:
+        # Puede haberlo creado otro proceso.
+        obj = _cargar(modelo)[1].get(nombre)
+    if obj is None and crear:
+        # No se agrega a la cache: post_save la invalida y la próxima consulta
+        # recarga la tabla (si la transacción se revierte, no queda un fantasma).
+        obj, _ = modelo.objects.get_or_create(nombre=nombre)
+    return obj
+
+
+def normalizar(nombre):
+    """Minúsculas y sin tildes: "Anticrético" y "anticretico" son lo mismo."""
+    nombre = unicodedata.normalize("NFKD", str(nombre or "")).encode("ascii", "ignore").decode()
+    return " ".join(nombre.lower().split())
+
+
+def buscar(modelo, nombre):
+    """Instancias de ``modelo`` cuyo nombre coincide con ``nombre`` sin mirar tildes ni mayúsculas."""
+    nombre = normalizar(nombre)
+    return [obj for n, obj in _tabla(modelo)[1].items() if normalizar(n) == nombre]
+
+
+def empresa_defecto():
+    """La primera empresa "century" (por pk), sin el LIKE sobre la tabla."""
+    empresas = _tabla(Empresa)[1].values()
+    candidatas = [e for e in empresas if "century" in e.nombre.lower()]
+    return min(candidatas, key=lambda e: e.pk, default=None)
+
+
+def invalidar(modelo=None):
+    if modelo is None:
+        _tablas.clear()
+    else:
+        _tablas.pop(modelo, None)
@@ -0,0 +1,158 @@
+"""
+Índice espacial de los inmuebles publicados (activos con coordenadas).
+
+- PostgreSQL: índice GiST parcial sobre ``point(longitud, latitud)``; el
+  filtro por bbox usa ``<@ box(...)``.
+- SQLite: tabla R*Tree ``home_inmueble_rtree`` mantenida por triggers sobre
+  ``home_inmueble``, así que también la actualizan ``bulk_create``/``update``.
+
+Si el motor no tiene ninguno de los dos (u otro motor), ``filtro_bbox``
+cae a rangos sobre latitud/longitud con el índice B-tree del mapa. Sobre el
+bbox se calcula la distancia exacta (``distancia_haversine``).
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .mapa import bbox_radio, distancia_haversine
+
+RTREE_TABLA = "home_inmueble_rtree"
+GIST_INDICE = "inmueble_punto_gist"
+CERCANOS_RADIO_INICIAL = 1000  # metros
+
+_PUBLICADO = "activo AND latitud IS NOT NULL AND longitud IS NOT NULL"
+_PUBLICADO_NEW = "NEW.activo AND NEW.latitud IS NOT NULL AND NEW.longitud IS NOT NULL"
+
+SQLITE_CREAR = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLA} USING rtree(id, lat_min, lat_max, lng_min, lng_max)",
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLA}_ai AFTER INSERT ON home_inmueble
+        WHEN {_PUBLICADO_NEW}
+        BEGIN
+            INSERT INTO {RTREE_TABLA} VALUES (NEW.id, NEW.latitud, NEW.latitud, NEW.longitud, NEW.longitud);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLA}_au
+        AFTER UPDATE OF activo, latitud, longitud ON home_inmueble
+        BEGIN
+            DELETE FROM {RTREE_TABLA} WHERE id = OLD.id;
+            INSERT INTO {RTREE_TABLA}
+                SELECT NEW.id, NEW.latitud, NEW.latitud, NEW.longitud, NEW.longitud
+                WHERE {_PUBLICADO_NEW};
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLA}_ad AFTER DELETE ON home_inmueble
+        BEGIN
+            DELETE FROM {RTREE_TABLA} WHERE id = OLD.id;
+        END""",
+]
+SQLITE_TRIGGERS = [f"{RTREE_TABLA}_ai", f"{RTREE_TABLA}_au", f"{RTREE_TABLA}_ad"]
+
+POSTGRES_CREAR = [
+    f"CREATE INDEX IF NOT EXISTS {GIST_INDICE} ON home_inmueble "
+    f"USING gist (point(longitud::float8, latitud::float8)) WHERE {_PUBLICADO}",
+]
+
+
+def crear_indice_espacial(conexion):
+    """
+    Crea (o repara) el índice espacial. Idempotente: en SQLite rehacer la
+    tabla ``home_inmueble`` (un ``AlterField``) borra los triggers, así que
+    ``post_migrate`` lo vuelve a correr y recarga el R*Tree si faltaban.
+    """
+    with conexion.cursor() as cursor:
+        if conexion.vendor == "postgresql":
+            for sql in POSTGRES_CREAR:
+                cursor.execute(sql)
+        elif conexion.vendor == "sqlite":
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                SQLITE_TRIGGERS,
+            )
+            if cursor.fetchone()[0] == len(SQLITE_TRIGGERS):
+                return
+            for sql in SQLITE_CREAR:
+                cursor.execute(sql)
+            cursor.execute(f"DELETE FROM {RTREE_TABLA}")
+            cursor.execute(
+                f"INSERT INTO {RTREE_TABLA} SELECT id, latitud, latitud, longitud, longitud "
+                f"FROM home_inmueble WHERE {_PUBLICADO}"
+            )
+    _disponible.clear()
+
+
+def reparar_indice_espacial(conexion):
+    """Para ``post_migrate``: si el R*Tree existe pero perdió los triggers, los recrea."""
+    if conexion.vendor == "sqlite" and RTREE_TABLA in conexion.introspection.table_names():
+        crear_indice_espacial(conexion)
+
+
+def borrar_indice_espacial(conexion):
+    with conexion.cursor() as cursor:
+        if conexion.vendor == "postgresql":
+            cursor.execute(f"DROP INDEX IF EXISTS {GIST_INDICE}")
+        elif conexion.vendor == "sqlite":
+            for trigger in SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute(f"DROP TABLE IF EXISTS {RTREE_TABLA}")
+    _disponible.clear()
+
+
+_disponible = {}  # (alias, base) -> bool
+
+
+def indice_disponible():
+    """Si la base actual tiene el índice espacial (se consulta una vez por base)."""
+    clave = (connection.alias, connection.settings_dict["NAME"])
+    if clave not in _disponible:
+        if connection.vendor == "sqlite":
+            _disponible[clave] = RTREE_TABLA in connection.introspection.table_names()
+        elif connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [GIST_INDICE])
+                _disponible[clave] = cursor.fetchone()[0]
+        else:
+            _disponible[clave] = False
+    return _disponible[clave]
+
+
+def filtro_bbox(oeste, sur, este, norte):
+    """``Q`` con los inmuebles publicados dentro del bbox, por el índice espacial."""
+    if not indice_disponible():
+        return Q(latitud__range=(sur, norte), longitud__range=(oeste, este))
+    if connection.vendor == "sqlite":
+        # R*Tree guarda float32 redondeando hacia afuera: puede sobrar algún
+        # candidato en el borde, nunca faltar (la distancia exacta filtra después).
+        sql = (
+            f"SELECT id FROM {RTREE_TABLA} "
+            "WHERE lat_max >= %s AND lat_min <= %s AND lng_max >= %s AND lng_min <= %s"
+        )
+        params = (sur, norte, oeste, este)
+    else:
+        sql = (
+            f"SELECT id FROM home_inmueble WHERE {_PUBLICADO} "
+            "AND point(longitud::float8, latitud::float8) <@ box(point(%s, %s), point(%s, %s))"
+        )
+        params = (oeste, sur, este, norte)
+    return Q(pk__in=RawSQL(sql, params))
+
+
+def en_radio(qs, lat, lng, radio_m):
+    """``qs`` a menos de ``radio_m`` metros, anotado con ``distancia_m`` y ordenado por cercanía."""
+    return (
+        qs.filter(filtro_bbox(*bbox_radio(lat, lng, radio_m)))
+        .annotate(distancia_m=distancia_haversine(lat, lng))
+        .filter(distancia_m__lte=radio_m)
+        .order_by("distancia_m", "-id")
+    )
+
+
+def cercanos(qs, lat, lng, k, radio_max):
+    """
+    Los ``k`` inmuebles de ``qs`` más cercanos a (lat, lng), hasta ``radio_max``
+    metros. Busca en radios crecientes: si dentro de un radio hay al menos
+    ``k``, esos son los ``k`` más cercanos de todo el catálogo.
+    """
+    radio = min(CERCANOS_RADIO_INICIAL, radio_max)
+    while True:
+        filas = list(en_radio(qs, lat, lng, radio)[:k])
+        if len(filas) >= k or radio >= radio_max:
+            return filas
+        radio = min(radio * 4, radio_max)
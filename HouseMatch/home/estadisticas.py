@@ -0,0 +1,138 @@
+"""
+Estadísticas de precio por m² por zona (``EstadisticaZona``).
+
+Cada grupo (ciudad, zona, tipo de propiedad, tipo de transacción) guarda
+cantidad, p25, mediana y p75 del USD/m² de sus inmuebles activos con precio
+y área, en una fila por mes. ``recalcular(claves)`` rehace solo los grupos
+que tocó una ingesta; ``recalcular()`` los rehace todos (comando
+``recalcular_estadisticas``). La primera actualización de un mes nuevo es
+completa, así cada mes tiene todos los grupos y la tendencia compara la
+mediana con la del último mes anterior registrado.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from . import catalogo
+from .models import EstadisticaZona, Inmueble, TipoPropiedad, TipoTransaccion
+
+ESTADISTICAS_GRUPOS_POR_CONSULTA = 200
+ESTADISTICAS_PROMPT_ZONAS = 5
+CAMPOS_CLAVE = ("ciudad", "zona", "tipo_propiedad_id", "tipo_transaccion_id")
+_TENDENCIA_MAX = Decimal("99999.99")
+_CENTAVOS = Decimal("0.01")
+
+
+def clave(inmueble):
+    return tuple(getattr(inmueble, campo) for campo in CAMPOS_CLAVE)
+
+
+def periodo_actual():
+    return timezone.localdate().replace(day=1)
+
+
+def _por_clave(qs, claves):
+    """Filtra ``qs`` por grupos, en tandas para no armar un WHERE gigante."""
+    claves = list(claves)
+    for inicio in range(0, len(claves), ESTADISTICAS_GRUPOS_POR_CONSULTA):
+        filtro = Q()
+        for valores in claves[inicio:inicio + ESTADISTICAS_GRUPOS_POR_CONSULTA]:
+            filtro |= Q(**dict(zip(CAMPOS_CLAVE, valores)))
+        yield qs.filter(filtro)
+
+
+def _decimal(valor):
+    return Decimal(str(valor)).quantize(_CENTAVOS)
+
+
+def recalcular(claves=None):
+    """
+    Recalcula la fila del mes en curso de los grupos ``claves`` (todos si es
+    None); borra la de los grupos que quedaron sin inmuebles. Devuelve la
+    cantidad de grupos con datos.
+    """
+    periodo = periodo_actual()
+    if claves is not None:
+        claves = set(claves)
+        if not claves:
+            return 0
+        if not EstadisticaZona.objects.filter(periodo=periodo).exists():
+            claves = None
+
+    publicados = Inmueble.objects.filter(activo=True, precio_usd__gt=0, area_construida__gt=0)
+    campos = (*CAMPOS_CLAVE, "precio_usd", "area_construida")
+    consultas = [publicados] if claves is None else _por_clave(publicados, claves)
+    precios_m2 = {}
+    for qs in consultas:
+        for *grupo, precio, area in qs.values_list(*campos).iterator():
+            precios_m2.setdefault(tuple(grupo), []).append(float(precio) / float(area))
+
+    anteriores = EstadisticaZona.objects.filter(periodo__lt=periodo).order_by("periodo")
+    consultas = [anteriores] if claves is None else _por_clave(anteriores, claves)
+    medianas_anteriores = {}
+    for qs in consultas:
+        for *grupo, mediana in qs.values_list(*CAMPOS_CLAVE, "mediana_m2"):
+            medianas_anteriores[tuple(grupo)] = mediana  # el mes más reciente gana
+
+    filas = []
+    for grupo, valores in precios_m2.items():
+        p25, mediana, p75 = (_decimal(v) for v in np.percentile(valores, [25, 50, 75]))
+        anterior = medianas_anteriores.get(grupo)
+        tendencia = None
+        if anterior:
+            tendencia = ((mediana - anterior) / anterior * 100).quantize(_CENTAVOS)
+            tendencia = max(-_TENDENCIA_MAX, min(_TENDENCIA_MAX, tendencia))
+        filas.append(EstadisticaZona(
+            periodo=periodo, **dict(zip(CAMPOS_CLAVE, grupo)), cantidad=len(valores),
+            p25_m2=p25, mediana_m2=mediana, p75_m2=p75, tendencia_pct=tendencia,
+        ))
+
+    del_mes = EstadisticaZona.objects.filter(periodo=periodo)
+    with transaction.atomic():
+        EstadisticaZona.objects.bulk_create(
+            filas,
+            update_conflicts=True,
+            unique_fields=["periodo", "ciudad", "zona", "tipo_propiedad", "tipo_transaccion"],
+            update_fields=["cantidad", "p25_m2", "mediana_m2", "p75_m2", "tendencia_pct", "actualizada_en"],
+            batch_size=500,
+        )
+        if claves is None:
+            vacias = [
+                pk for pk, *grupo in del_mes.values_list("pk", *CAMPOS_CLAVE) if tuple(grupo) not in precios_m2
+            ]
+            del_mes.filter(pk__in=vacias).delete()
+        else:
+            for qs in _por_clave(del_mes, claves - precios_m2.keys()):
+                qs.delete()
+    return len(filas)
+
+
+def vigentes():
+    """Filas del último mes con estadísticas."""
+    ultimo = EstadisticaZona.objects.aggregate(ultimo=Max("periodo"))["ultimo"]
+    return (
+        EstadisticaZona.objects.filter(periodo=ultimo)
+        .select_related("tipo_propiedad", "tipo_transaccion")
+    )
+
+
+def para_sujeto(sujeto):
+    """
+    Contexto de mercado para el ACM: la fila de la zona del sujeto (si hay) y
+    las zonas con más publicaciones de su ciudad (de todas si no trae
+    ciudad), para el mismo tipo y transacción.
+    """
+    tipos = catalogo.buscar(TipoPropiedad, sujeto.get("tipo_propiedad"))
+    transacciones = catalogo.buscar(TipoTransaccion, sujeto.get("tipo_transaccion"))
+    if not tipos or not transacciones:
+        return []
+    qs = vigentes().filter(tipo_propiedad__in=tipos, tipo_transaccion__in=transacciones)
+    ciudad, zona = (sujeto.get("ciudad") or "").strip(), (sujeto.get("zona") or "").strip()
+    if ciudad:
+        qs = qs.filter(ciudad__iexact=ciudad)
+    propias = list(qs.filter(zona__iexact=zona)) if zona else []
+    otras = qs.exclude(pk__in=[e.pk for e in propias]).order_by("-cantidad", "ciudad", "zona")
+    return propias + list(otras[:ESTADISTICAS_PROMPT_ZONAS])
@@ -0,0 +1,320 @@
+"""
+Ingesta por lotes de inmuebles (scraper).
+
+Valida cada fila sin tocar la base, resuelve los catálogos desde la cache en
+proceso (``home.catalogo``) y escribe inmuebles e imágenes con ``bulk_create``/``bulk_update``
+dentro de una sola transacción. Los errores se reportan por fila con su
+índice en el lote.
+
+Las filas con ``id_externo`` quedan identificadas por ``(fuente, id_externo)``.
+En modo upsert una fila ya conocida se compara por ``hash_contenido``: si no
+cambió solo se marca como vista; si cambió se actualizan únicamente los
+campos (e imágenes) distintos. ``desactivar_faltantes`` cierra un crawl
+completo dando de baja lo que no se vio. Al final de cada escritura se
+recalculan las estadísticas de las zonas tocadas (``home.estadisticas``).
+"""
+import hashlib
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import catalogo, estadisticas
+from .mapa import actualizacion_diferida, actualizar_en_mapa
+from .models import Departamento, Empresa, ImagenInmueble, Inmueble, TipoPropiedad, TipoTransaccion
+from .serializers import InmuebleCreateSerializer
+
+INGESTA_LOTE_MAX = 1000
+INGESTA_BATCH_SIZE = 500
+CAMPOS_CLAVE = ("fuente", "id_externo")
+YA_EXISTE = "Ya existe para esta fuente; use modo upsert."
+
+
+class InmuebleLoteSerializer(InmuebleCreateSerializer):
+    """
+    Igual que ``InmuebleCreateSerializer`` pero los catálogos llegan como
+    nombres sin resolver: la validación de cada fila no hace consultas.
+    La unicidad de ``(fuente, id_externo)`` se resuelve por lote.
+    """
+    empresa = serializers.CharField(max_length=100, required=False, allow_null=True)
+    tipo_propiedad = serializers.CharField(max_length=50)
+    tipo_transaccion = serializers.CharField(max_length=50)
+    departamento = serializers.CharField(max_length=50)
+
+    class Meta(InmuebleCreateSerializer.Meta):
+        validators = []
+
+
+CATALOGOS_FILA = (
+    ("tipo_propiedad", TipoPropiedad, True),
+    ("tipo_transaccion", TipoTransaccion, False),
+    ("departamento", Departamento, False),
+)
+
+
+def resolver_catalogos(datos):
+    """
+    Reemplaza los nombres de catálogo por instancias (desde ``home.catalogo``,
+    sin consultas salvo tipos de propiedad nuevos, que se crean como en
+    ``SlugGetOrCreateField``). Devuelve los errores de la fila, si hay.
+    """
+    errores = {}
+    for campo, modelo, crear in CATALOGOS_FILA:
+        obj = catalogo.obtener(modelo, datos[campo], crear=crear)
+        if obj is None:
+            errores[campo] = [f"No existe: {datos[campo]}."]
+        datos[campo] = obj
+    empresa = datos.get("empresa")
+    if empresa:
+        datos["empresa"] = catalogo.obtener(Empresa, empresa)
+        if datos["empresa"] is None:
+            errores["empresa"] = [f"No existe: {empresa}."]
+    else:
+        datos["empresa"] = catalogo.empresa_defecto()
+    return errores
+
+
+def calcular_hash(datos):
+    """sha256 del contenido validado de una fila (sin la clave externa)."""
+    contenido = {k: v for k, v in datos.items() if k not in CAMPOS_CLAVE}
+    crudo = json.dumps(contenido, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+
+def clave_externa(datos):
+    if not datos.get("id_externo"):
+        return None
+    return (datos.get("fuente") or "", datos["id_externo"])
+
+
+def validar_lote(filas):
+    """Devuelve ``(validas, errores)``; ``validas`` es una lista de ``(indice, datos)``."""
+    # Una sola instancia para todo el lote (como hace ListSerializer): construir
+    # los campos del ModelSerializer por fila cuesta más que validarla.
+    serializer = InmuebleLoteSerializer()
+    validas, errores = [], []
+    for indice, fila in enumerate(filas):
+        try:
+            datos = dict(serializer.run_validation(fila))
+        except serializers.ValidationError as exc:
+            errores.append({"indice": indice, "errores": exc.detail})
+            continue
+        # "" no es una clave: la restricción única solo aplica a no nulos.
+        datos["id_externo"] = datos.get("id_externo") or None
+        datos["hash_contenido"] = calcular_hash(datos)
+        validas.append((indice, datos))
+    return validas, errores
+
+
+def _existentes(claves):
+    por_fuente = {}
+    for fuente, id_externo in claves:
+        por_fuente.setdefault(fuente, []).append(id_externo)
+    filtro = Q()
+    for fuente, ids in por_fuente.items():
+        filtro |= Q(fuente=fuente, id_externo__in=ids)
+    qs = Inmueble.objects.filter(filtro).prefetch_related("imagenes")
+    return {(i.fuente, i.id_externo): i for i in qs}
+
+
+def _aplicar_cambios(inmueble, datos):
+    """Copia en ``inmueble`` solo los campos distintos. Devuelve sus nombres."""
+    cambiados = set()
+    for campo, valor in datos.items():
+        if campo == "imagenes":
+            continue
+        attname = Inmueble._meta.get_field(campo).attname
+        nuevo = valor.pk if attname != campo and valor is not None else valor
+        if getattr(inmueble, attname) != nuevo:
+            setattr(inmueble, attname, nuevo)
+            cambiados.add(campo)
+    return cambiados
+
+
+def ingestar_lote(filas, upsert=False):
+    """
+    Escribe las filas válidas de ``filas`` y devuelve
+    ``{"creados", "actualizados", "sin_cambios": [{"indice", "id"}],
+    "errores": [{"indice", "errores"}]}``.
+
+    Sin ``upsert`` una clave externa ya existente es un error de la fila; con
+    ``upsert`` la fila actualiza el inmueble existente. ``bulk_create`` y
+    ``bulk_update`` no emiten señales, así que el mapa se parchea una sola
+    vez al final con todos los ids tocados.
+    """
+    validas, errores = validar_lote(filas)
+    return escribir_lote(validas, errores, upsert=upsert)
+
+
+def escribir_lote(validas, errores=(), upsert=False):
+    """
+    Segunda mitad de ``ingestar_lote``: escribe filas que ya pasaron por
+    ``validar_lote`` (por ejemplo en otro proceso) y arma el resultado,
+    sumando ``errores`` de la validación.
+    """
+    resultado = {"creados": [], "actualizados": [], "sin_cambios": [], "errores": []}
+    errores = list(errores)
+    claves = {}
+    candidatas = []
+    for indice, datos in validas:
+        clave = clave_externa(datos)
+        if upsert and clave is None:
+            errores.append({"indice": indice, "errores": {"id_externo": ["Requerido en modo upsert."]}})
+        elif clave is not None and clave in claves:
+            errores.append({"indice": indice, "errores": {
+                "id_externo": [f"Repetido en el lote (fila {claves[clave]})."]
+            }})
+        else:
+            if clave is not None:
+                claves[clave] = indice
+            candidatas.append((indice, datos))
+
+    existentes = _existentes(claves) if claves else {}
+    resueltas = []
+    for indice, datos in candidatas:
+        errores_fila = resolver_catalogos(datos)
+        if errores_fila:
+            if not upsert and clave_externa(datos) in existentes:
+                errores_fila["id_externo"] = [YA_EXISTE]
+            errores.append({"indice": indice, "errores": errores_fila})
+        else:
+            resueltas.append((indice, datos))
+    nuevas, cambios = _separar(resueltas, existentes, upsert, resultado["sin_cambios"], errores)
+
+    grupos = set()
+    ahora = timezone.now()
+    with actualizacion_diferida():
+        while True:
+            try:
+                with transaction.atomic():
+                    creados = _crear(nuevas, ahora)
+                    # Un cambio de zona o tipo mueve el inmueble de grupo: cuentan los dos.
+                    grupos.update(estadisticas.clave(actual) for _, actual, _ in cambios)
+                    _actualizar(cambios, ahora)
+                    if resultado["sin_cambios"]:
+                        Inmueble.objects.filter(
+                            pk__in=[fila["id"] for fila in resultado["sin_cambios"]]
+                        ).update(ultimo_visto=ahora)
+                break
+            except IntegrityError:
+                # Otra ingesta creó alguna de estas claves después de leer
+                # ``existentes``: esas filas se reparten de nuevo y se reintenta
+                # (``_crear`` va primero, así que nada más se escribió).
+                ya_creadas = _existentes({clave_externa(datos) for _, datos in nuevas} - {None})
+                if not ya_creadas:
+                    raise
+                nuevas, mas_cambios = _separar(nuevas, ya_creadas, upsert, resultado["sin_cambios"], errores)
+                cambios += mas_cambios
+
+        tocados = [i.pk for i in creados] + [actual.pk for _, actual, _ in cambios]
+        if tocados:
+            actualizar_en_mapa(tocados)
+    grupos.update(estadisticas.clave(i) for i in creados)
+    grupos.update(estadisticas.clave(actual) for _, actual, _ in cambios)
+    estadisticas.recalcular(grupos)
+
+    resultado["errores"] = sorted(errores, key=lambda e: e["indice"])
+    resultado["creados"] = [
+        {"indice": indice, "id": inmueble.pk} for inmueble, (indice, _) in zip(creados, nuevas)
+    ]
+    resultado["actualizados"] = [{"indice": indice, "id": actual.pk} for indice, actual, _ in cambios]
+    return resultado
+
+
+def _separar(filas, existentes, upsert, sin_cambios, errores):
+    """
+    Reparte filas con catálogos resueltos según ``existentes``: devuelve
+    ``(nuevas, cambios)`` y agrega a ``sin_cambios`` y ``errores`` el resto.
+    """
+    nuevas, cambios = [], []
+    for indice, datos in filas:
+        actual = existentes.get(clave_externa(datos))
+        if actual is None:
+            nuevas.append((indice, datos))
+        elif not upsert:
+            errores.append({"indice": indice, "errores": {"id_externo": [YA_EXISTE]}})
+        elif actual.hash_contenido == datos["hash_contenido"] and actual.activo == datos.get("activo", True):
+            sin_cambios.append({"indice": indice, "id": actual.pk})
+        else:
+            cambios.append((indice, actual, datos))
+    return nuevas, cambios
+
+
+def _crear(nuevas, ahora):
+    inmuebles = Inmueble.objects.bulk_create(
+        [
+            Inmueble(ultimo_visto=ahora, **{k: v for k, v in datos.items() if k != "imagenes"})
+            for _, datos in nuevas
+        ],
+        batch_size=INGESTA_BATCH_SIZE,
+    )
+    ImagenInmueble.objects.bulk_create(
+        [
+            ImagenInmueble(inmueble=inmueble, url=url, orden=orden)
+            for inmueble, (_, datos) in zip(inmuebles, nuevas)
+            for orden, url in enumerate(datos["imagenes"])
+        ],
+        batch_size=INGESTA_BATCH_SIZE,
+    )
+    return inmuebles
+
+
+def _actualizar(cambios, ahora):
+    campos = {"ultimo_visto"}
+    con_imagenes_nuevas = []
+    for _, actual, datos in cambios:
+        campos |= _aplicar_cambios(actual, datos)
+        actual.ultimo_visto = ahora
+        if [img.url for img in actual.imagenes.all()] != datos["imagenes"]:
+            con_imagenes_nuevas.append((actual, datos["imagenes"]))
+    if not cambios:
+        return
+
+    Inmueble.objects.bulk_update(
+        [actual for _, actual, _ in cambios], sorted(campos), batch_size=INGESTA_BATCH_SIZE
+    )
+    if con_imagenes_nuevas:
+        ImagenInmueble.objects.filter(inmueble__in=[i for i, _ in con_imagenes_nuevas]).delete()
+        ImagenInmueble.objects.bulk_create(
+            [
+                ImagenInmueble(inmueble=inmueble, url=url, orden=orden)
+                for inmueble, urls in con_imagenes_nuevas
+                for orden, url in enumerate(urls)
+            ],
+            batch_size=INGESTA_BATCH_SIZE,
+        )
+
+
+def marcar_vistos(fuente, ids_externos):
+    """
+    Marca como vistos ahora los inmuebles de ``fuente`` con esos
+    ``id_externo``: filas del crawl que no se pudieron escribir (por errores
+    de validación) no deben contar como ausentes en ``desactivar_faltantes``.
+    """
+    ids_externos = [i for i in ids_externos if i]
+    if not ids_externos:
+        return 0
+    return Inmueble.objects.filter(fuente=fuente, id_externo__in=ids_externos).update(
+        ultimo_visto=timezone.now()
+    )
+
+
+def desactivar_faltantes(fuente, desde):
+    """
+    Cierra un crawl completo de ``fuente`` que empezó en ``desde``: los
+    inmuebles activos de esa fuente que no se vieron desde entonces pasan a
+    ``activo=False``. Devuelve la cantidad dada de baja.
+    """
+    faltantes = list(
+        Inmueble.objects.filter(fuente=fuente, activo=True, id_externo__isnull=False)
+        .filter(Q(ultimo_visto__lt=desde) | Q(ultimo_visto__isnull=True))
+        .values_list("pk", *estadisticas.CAMPOS_CLAVE)
+    )
+    ids = [pk for pk, *_ in faltantes]
+    if ids:
+        Inmueble.objects.filter(pk__in=ids).update(activo=False)
+        actualizar_en_mapa(ids)
+        estadisticas.recalcular(tuple(grupo) for _, *grupo in faltantes)
+    return len(ids)
@@ -0,0 +1,109 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from home.models import Inmueble
+
+# Consultas calientes: se ejecutan los endpoints reales (con la cache
+# desactivada para que lleguen a la base) y se capturan sus SELECT.
+ENDPOINTS = [
+    ("mapa completo", "/api/inmuebles/mapa/"),
+    ("mapa viewport", "/api/inmuebles/mapa/?bbox=-63.30,-17.90,-63.05,-17.65&zoom=14"),
+    ("mapa marcadores viewport", "/api/inmuebles/mapa/?vista=marcadores&bbox=-63.30,-17.90,-63.05,-17.65&zoom=14"),
+    ("mapa clusters", "/api/inmuebles/mapa/?modo=clusters&vista=marcadores&zoom=10"),
+    ("búsqueda sin filtros", "/api/inmuebles/buscar/?vista=marcadores"),
+    ("búsqueda por precio", "/api/inmuebles/buscar/?precio_min=50000&precio_max=150000&min_cuartos=2"),
+    ("búsqueda por tipo", "/api/inmuebles/buscar/?tipo_transaccion=venta&piscina=1"),
+    ("búsqueda por radio", "/api/inmuebles/buscar/?lat=-17.78&lng=-63.18&radio=2000"),
+    ("cercanos", "/api/inmuebles/cercanos/?lat=-17.78&lng=-63.18&k=10&vista=marcadores"),
+    ("detalle por ids", "/api/inmuebles/detalle/?ids=1,2,3"),
+]
+
+# Tablas donde un recorrido completo importa; los catálogos tienen pocas filas.
+TABLAS_GRANDES = {"home_inmueble", "home_imageninmueble"}
+
+# SQLite: "SCAN tabla" sin índice. Postgres: "Seq Scan on tabla".
+RECORRIDO_COMPLETO = {
+    "sqlite": re.compile(r"\bSCAN (\w+)(?: AS \w+)?$"),
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+}
+
+
+def consultas_orm():
+    """Consultas calientes que no salen de un endpoint (ingesta)."""
+    return [
+        ("ingesta: existentes por clave externa", Inmueble.objects.filter(fuente="c21", id_externo__in=["1", "2"])),
+        (
+            "ingesta: faltantes de un crawl",
+            Inmueble.objects.filter(fuente="c21", activo=True, id_externo__isnull=False)
+            .filter(Q(ultimo_visto__lt=timezone.now()) | Q(ultimo_visto__isnull=True))
+            .values_list("pk", flat=True),
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Corre EXPLAIN sobre las consultas calientes de la app y marca los recorridos completos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--estricto', action='store_true',
+            help='Termina con error si alguna consulta recorre completa una tabla grande',
+        )
+
+    def handle(self, *args, **options):
+        patron = RECORRIDO_COMPLETO.get(connection.vendor)
+        if patron is None:
+            raise CommandError(f'Motor no soportado: {connection.vendor} (sqlite o postgresql).')
+
+        consultas = []
+        cliente = Client()
+        dummy = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+        with override_settings(CACHES=dummy, ALLOWED_HOSTS=["*"]):
+            for nombre, url in ENDPOINTS:
+                with CaptureQueriesContext(connection) as capturadas:
+                    cliente.get(url)
+                consultas.extend(
+                    (nombre, q["sql"], ()) for q in capturadas.captured_queries
+                    if q["sql"].lstrip().upper().startswith("SELECT")
+                )
+        consultas.extend((nombre, *qs.query.sql_with_params()) for nombre, qs in consultas_orm())
+
+        marcadas = 0
+        for nombre, sql, params in consultas:
+            plan = self._explain(sql, params)
+            completas = sorted({
+                m.group(1) for linea in plan if (m := patron.search(linea)) and m.group(1) in TABLAS_GRANDES
+            })
+            marcadas += bool(completas)
+            estado = self.style.ERROR(f'RECORRIDO COMPLETO: {", ".join(completas)}') if completas else self.style.SUCCESS('ok')
+            self.stdout.write(f'{nombre}: {estado}')
+            if options['verbosity'] >= 2 or completas:
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f'  {sql}')
+                for linea in plan:
+                    self.stdout.write(f'    {linea}')
+
+        self.stdout.write(f'{len(consultas)} consultas, {marcadas} con recorrido completo.')
+        if options['estricto'] and marcadas:
+            raise CommandError(f'{marcadas} consultas recorren completa una tabla grande.')
+
+    def _explain(self, sql, params):
+        prefijo = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+        with connection.cursor() as cursor:
+            cursor.execute(prefijo + sql, params)
+            filas = cursor.fetchall()
+        if connection.vendor == "sqlite":
+            # (id, padre, _, detalle): se indenta según la profundidad del nodo.
+            profundidad = {0: -1}
+            lineas = []
+            for id_, padre, _, detalle in filas:
+                profundidad[id_] = profundidad.get(padre, -1) + 1
+                lineas.append("  " * profundidad[id_] + detalle)
+            return lineas
+        return [fila[0] for fila in filas]
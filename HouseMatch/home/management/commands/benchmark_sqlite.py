@@ -0,0 +1,162 @@
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from home.ingesta import ingestar_lote
+from home.mapa import actualizacion_diferida
+from home.models import Departamento, Inmueble, TipoPropiedad, TipoTransaccion
+
+FUENTE = "benchmark"
+# Un viewport de barrio: la lectura es corta, así que lo que se mide es la espera por locks.
+URL_MAPA = "/api/inmuebles/mapa/?vista=marcadores&bbox=-63.20,-17.80,-63.16,-17.76&zoom=16"
+
+
+def filas_sinteticas(cantidad, catalogos, semilla=0):
+    """Filas de ``ingestar_lote`` con clave ``(benchmark, n)`` alrededor de Santa Cruz."""
+    azar = random.Random(semilla)
+    tipo_propiedad, tipo_transaccion, departamento = catalogos
+    return [
+        {
+            "fuente": FUENTE,
+            "id_externo": str(n),
+            "tipo_propiedad": tipo_propiedad,
+            "tipo_transaccion": tipo_transaccion,
+            "departamento": departamento,
+            "titulo": f"Inmueble de prueba {n}",
+            "cant_cuartos": azar.randint(1, 5),
+            "cant_banios": azar.randint(1, 4),
+            "area_construida": "120.00",
+            "area_terreno": "200.00",
+            "precio_usd": f"{azar.randint(40, 400) * 1000}.00",
+            "calle": "Calle de prueba",
+            "zona": "Centro",
+            "ciudad": "Santa Cruz",
+            "latitud": f"{-17.78 + azar.uniform(-0.1, 0.1):.6f}",
+            "longitud": f"{-63.18 + azar.uniform(-0.1, 0.1):.6f}",
+            "imagenes": [f"https://example.com/{n}.jpg"],
+        }
+        for n in range(cantidad)
+    ]
+
+
+def leer_mapa(url, pragmas, fin, resultados):
+    """
+    Proceso lector (como un worker de gunicorn): pide ``url`` con la cache
+    desactivada hasta que ``fin`` se marca y devuelve latencias y errores.
+    """
+    import django
+    django.setup()  # Con "spawn" el proceso arranca sin Django configurado.
+    dummy = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    latencias, errores = [], 0
+    with override_settings(SQLITE_PRAGMAS=pragmas, CACHES=dummy, ALLOWED_HOSTS=["*"]):
+        cliente = Client()
+        while not fin.is_set():
+            t0 = time.perf_counter()
+            try:
+                ok = cliente.get(url).status_code == 200
+            except OperationalError:  # database is locked
+                ok = False
+            if ok:
+                latencias.append(time.perf_counter() - t0)
+            else:
+                errores += 1
+    resultados.put((latencias, errores))
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia de lectura de /api/inmuebles/mapa/ mientras corre una ingesta '
+        'masiva, con el journal por defecto de SQLite (antes) y con SQLITE_PRAGMAS (después)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=3000, help='Filas a ingestar (default: 3000)')
+        parser.add_argument('--lote', type=int, default=250, help='Filas por lote de ingesta (default: 250)')
+        parser.add_argument('--lectores', type=int, default=2, help='Procesos que leen el mapa (default: 2)')
+        parser.add_argument('--url', default=URL_MAPA, help='URL que leen los lectores (default: un viewport)')
+        parser.add_argument(
+            '--modo', choices=['antes', 'despues', 'ambos'], default='ambos',
+            help='antes: journal DELETE sin pragmas; despues: SQLITE_PRAGMAS (default: ambos)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError('Este benchmark es solo para SQLite.')
+        if min(options['filas'], options['lote'], options['lectores']) < 1:
+            raise CommandError('--filas, --lote y --lectores deben ser mayores que 0.')
+        catalogos = tuple(
+            modelo.objects.values_list("nombre", flat=True).order_by("pk").first()
+            for modelo in (TipoPropiedad, TipoTransaccion, Departamento)
+        )
+        if None in catalogos:
+            raise CommandError('Faltan catálogos: correr primero `python manage.py seed_catalogo`.')
+        if Inmueble.objects.filter(fuente=FUENTE).exists():
+            raise CommandError(f'Ya hay inmuebles con fuente "{FUENTE}" (¿un benchmark interrumpido?).')
+
+        filas = filas_sinteticas(options['filas'], catalogos)
+        modos = ['antes', 'despues'] if options['modo'] == 'ambos' else [options['modo']]
+        self.stdout.write(
+            f'{Inmueble.objects.count()} inmuebles en la base; {len(filas)} filas a ingestar '
+            f'en lotes de {options["lote"]} con {options["lectores"]} lectores.'
+        )
+        self.stdout.write(f'{"modo":<8} {"lecturas":>8} {"p50 ms":>8} {"p95 ms":>8} {"máx ms":>8} '
+                          f'{"errores":>8} {"ingesta filas/s":>16}')
+        try:
+            for modo in modos:
+                r = self._correr(modo, filas, options['lote'], options['lectores'], options['url'])
+                self.stdout.write(
+                    f'{modo:<8} {len(r["latencias"]):>8} {percentil(r["latencias"], 0.5) * 1000:>8.1f} '
+                    f'{percentil(r["latencias"], 0.95) * 1000:>8.1f} {max(r["latencias"], default=0) * 1000:>8.1f} '
+                    f'{r["errores"]:>8} {len(filas) / r["ingesta"]:>16.0f}'
+                )
+        finally:
+            # La próxima conexión vuelve a aplicar SQLITE_PRAGMAS (journal incluido).
+            connection.close()
+
+    def _correr(self, modo, filas, lote, lectores, url):
+        pragmas = settings.SQLITE_PRAGMAS if modo == 'despues' else {}
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            # journal_mode queda guardado en el archivo: se fija explícitamente.
+            connection.close()
+            with connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA journal_mode = {pragmas.get('journal_mode', 'DELETE')}")
+            connection.close()
+
+            contexto = multiprocessing.get_context()
+            fin, resultados = contexto.Event(), contexto.Queue()
+            procesos = [
+                contexto.Process(target=leer_mapa, args=(url, pragmas, fin, resultados))
+                for _ in range(lectores)
+            ]
+            for proceso in procesos:
+                proceso.start()
+            t0 = time.perf_counter()
+            try:
+                for inicio in range(0, len(filas), lote):
+                    ingestar_lote(filas[inicio:inicio + lote], upsert=True)
+                ingesta = time.perf_counter() - t0
+            finally:
+                fin.set()
+                medidos = [resultados.get() for _ in procesos]
+                for proceso in procesos:
+                    proceso.join()
+                with actualizacion_diferida():
+                    Inmueble.objects.filter(fuente=FUENTE).delete()
+        return {
+            "latencias": [latencia for latencias, _ in medidos for latencia in latencias],
+            "errores": sum(errores for _, errores in medidos),
+            "ingesta": ingesta,
+        }
@@ -0,0 +1,165 @@
+import os
+import time
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from home.c21 import FUENTE, iterar_resultados, normalizar
+from home.ingesta import clave_externa, desactivar_faltantes, escribir_lote, marcar_vistos, validar_lote
+
+
+def rutas_json(rutas):
+    """Expande directorios a sus ``*.json`` (ordenados); los archivos pasan tal cual."""
+    archivos = []
+    for ruta in map(Path, rutas):
+        if ruta.is_dir():
+            archivos.extend(sorted(ruta.glob("*.json")))
+        elif ruta.is_file():
+            archivos.append(ruta)
+        else:
+            raise CommandError(f"No existe: {ruta}")
+    return archivos
+
+
+def procesar_archivo(ruta, tamanio):
+    """
+    Parte paralelizable del import: parsea, normaliza y valida un archivo sin
+    tocar la base, de a ``tamanio`` resultados a medida que el parser los
+    lee. Genera ``(ids, validas, errores)`` por tramo, con índices relativos
+    al tramo. Un archivo que no es JSON válido corta el import con
+    ``CommandError``.
+    """
+    with open(ruta, encoding="utf-8") as f:
+        resultados = iterar_resultados(f)
+        while True:
+            try:
+                tramo = [normalizar(resultado) for resultado in islice(resultados, tamanio)]
+            except ValueError as e:
+                raise CommandError(f"{ruta}: {e}") from e
+            if not tramo:
+                return
+            validas, errores = validar_lote(tramo)
+            yield [fila["id_externo"] for fila in tramo], validas, errores
+
+
+def procesar_archivo_en_worker(ruta, tamanio):
+    # Un generador no cruza procesos: el worker devuelve los tramos del archivo.
+    return list(procesar_archivo(ruta, tamanio))
+
+
+def _iniciar_worker():
+    # Con "spawn"/"forkserver" el proceso hijo arranca sin Django configurado.
+    import django
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Importa volcados de búsqueda de Century 21 (pagina_N.json) a Inmueble/ImagenInmueble'
+
+    def add_arguments(self, parser):
+        parser.add_argument('rutas', nargs='+', help='Archivos JSON o directorios con archivos JSON')
+        parser.add_argument('--lote', type=int, default=500, help='Filas por inserción (default: 500)')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Procesos que parsean y validan archivos en paralelo (default: núcleos disponibles)',
+        )
+        parser.add_argument(
+            '--modo', choices=['upsert', 'crear'], default='upsert',
+            help='upsert actualiza los inmuebles ya importados; crear los reporta como error',
+        )
+        parser.add_argument(
+            '--desactivar-faltantes', action='store_true',
+            help='Crawl completo: da de baja los inmuebles de C21 que no aparecen en los archivos',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Solo parsea y valida (sin resolver catálogos ni escribir) y reporta filas/s',
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0.')
+        if options['workers'] < 1:
+            raise CommandError('--workers debe ser mayor que 0.')
+        if options['dry_run'] and options['desactivar_faltantes']:
+            raise CommandError('--desactivar-faltantes no tiene sentido con --dry-run.')
+        archivos = rutas_json(options['rutas'])
+        self.options = options
+        self.inicio, self.t0 = timezone.now(), time.perf_counter()
+        self.totales = dict.fromkeys(
+            ("filas", "validas", "creados", "actualizados", "sin_cambios", "errores", "repetidas"), 0
+        )
+        # Filas válidas por escribir, por clave externa (o índice si no tiene).
+        self.pendientes, self.errores, self.ids = {}, [], {}
+        self.ids_con_error = set()  # aparecieron en el crawl aunque no se escribieron
+
+        workers, tamanio = min(options['workers'], len(archivos)), options['lote']
+        if workers > 1:
+            # Un solo escritor: pool.map entrega los archivos en orden.
+            with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker) as pool:
+                tramos = pool.map(procesar_archivo_en_worker, archivos, [tamanio] * len(archivos))
+                self._consumir(tramo for por_archivo in tramos for tramo in por_archivo)
+        else:
+            self._consumir(tramo for ruta in archivos for tramo in procesar_archivo(ruta, tamanio))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Dry run terminado. {self._progreso()}'))
+            return
+        if options['desactivar_faltantes']:
+            marcar_vistos(FUENTE, self.ids_con_error)
+            desactivados = desactivar_faltantes(FUENTE, self.inicio)
+            self.stdout.write(f'Desactivados (ausentes del crawl): {desactivados}')
+        self.stdout.write(self.style.SUCCESS(f'Importación terminada. {self._progreso()}'))
+
+    def _consumir(self, procesados):
+        lote = self.options['lote']
+        for ids, validas, errores in procesados:
+            desde = self.totales["filas"]
+            self.totales["filas"] += len(ids)
+            self.ids.update((desde + i, id_externo) for i, id_externo in enumerate(ids))
+            for i, datos in validas:
+                self._agregar(desde + i, datos)
+            self.errores.extend({**e, "indice": desde + e["indice"]} for e in errores)
+            while len(self.pendientes) >= lote:
+                self._escribir([self.pendientes.pop(clave) for clave in list(islice(self.pendientes, lote))])
+        if self.pendientes or self.errores:
+            self._escribir(list(self.pendientes.values()))
+            self.pendientes = {}
+
+    def _agregar(self, indice, datos):
+        """
+        Las páginas de un crawl se solapan: si el inmueble ya está pendiente
+        de escritura, gana la última aparición (la anterior no se escribe).
+        """
+        clave = clave_externa(datos) or indice
+        if self.pendientes.pop(clave, None) is not None:
+            self.totales["repetidas"] += 1
+        self.pendientes[clave] = (indice, datos)
+
+    def _escribir(self, validas):
+        errores, self.errores = self.errores, []
+        if self.options['dry_run']:
+            resultado = {"validas": validas, "errores": errores}
+        else:
+            resultado = escribir_lote(validas, errores, upsert=self.options['modo'] == 'upsert')
+        for clave in self.totales.keys() & resultado.keys():
+            self.totales[clave] += len(resultado[clave])
+        self.ids_con_error.update(self.ids[error["indice"]] for error in resultado["errores"])
+        if self.options['verbosity'] >= 2:
+            for error in resultado["errores"]:
+                self.stderr.write(f'  {self.ids[error["indice"]] or "(sin id)"}: {error["errores"]}')
+        self.stdout.write(self._progreso())
+
+    def _progreso(self):
+        t, segundos = self.totales, time.perf_counter() - self.t0
+        velocidad = f'{t["filas"] / segundos if segundos else 0:.0f} filas/s'
+        repetidas = f', {t["repetidas"]} repetidas' if t["repetidas"] else ''
+        if self.options['dry_run']:
+            return f'{t["filas"]} filas: {t["validas"]} válidas, {t["errores"]} con errores{repetidas} ({velocidad})'
+        return (
+            f'{t["filas"]} filas: {t["creados"]} nuevas, {t["actualizados"]} actualizadas, '
+            f'{t["sin_cambios"]} sin cambios, {t["errores"]} con errores{repetidas} ({velocidad})'
+        )
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from home import estadisticas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las estadísticas de precio por m² de todas las zonas para el mes en curso'
+
+    def handle(self, *args, **options):
+        t0 = time.perf_counter()
+        grupos = estadisticas.recalcular()
+        self.stdout.write(self.style.SUCCESS(
+            f'{grupos} grupos (ciudad, zona, tipo, transacción) en {time.perf_counter() - t0:.2f} s.'
+        ))
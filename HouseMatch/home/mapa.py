@@ -0,0 +1,520 @@
+import gzip
+import logging
+import math
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, FloatField
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+from .models import Inmueble
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se ofrece gzip
+    brotli = None
+
+MAPA_CACHE_KEY = 'mapa_geojson'
+MAPA_MARCADORES_CACHE_KEY = 'mapa_geojson_marcadores'
+MAPA_CACHE_TTL = 60  # segundos; frescura del payload
+MAPA_STALE_TTL = 60 * 60  # segundos que se conserva la copia anterior
+MAPA_LOCK_TTL = 30  # segundos máximos de una regeneración
+MAPA_LOCK_ESPERA = 5  # segundos que espera quien no tiene copia previa
+MAPA_XFETCH_BETA = 1.0  # >1 refresca antes, <1 más cerca de la expiración
+MAPA_VERSION_KEY = 'mapa_version'
+MAPA_LIMITE = 1000  # inmuebles del feed completo (sin bbox)
+MAPA_BBOX_LIMITE = 2000
+MAPA_ZOOM_MAX = 22
+DETALLE_IDS_MAX = 100
+ID_MAX = 2 ** 63 - 1  # mayor clave primaria que guarda un BigAutoField
+
+# Por debajo o igual a este zoom el mapa recibe clusters en lugar de puntos.
+MAPA_CLUSTER_ZOOM_MAX = 13
+MAPA_CLUSTER_CACHE_KEY = 'mapa_clusters'
+MAPA_CLUSTER_TTL = 60 * 10  # segundos; la clave lleva la versión del mapa
+MAPA_CLUSTER_CELDA_PX = 60  # ancho de celda en píxeles de pantalla
+
+# Almacén por inmueble del feed completo: un item por feature y un índice
+# con los ids, parcheados por señales en lugar de invalidar todo.
+MAPA_ITEM_KEY = 'mapa_item'
+MAPA_INDICE_KEY = 'mapa_indice'
+MAPA_ALMACEN_TTL = 60 * 60 * 6  # segundos; cota de cualquier desincronización
+
+RADIO_TIERRA_M = 6371000
+
+# Formato columnar: columnas numéricas, columnas codificadas con diccionario
+# y banderas empaquetadas en un entero por inmueble.
+COLUMNAR_NUMERICAS = (
+    "precio_usd", "precio_bs", "area_construida", "area_terreno", "cant_cuartos", "cant_banios",
+)
+COLUMNAR_DICCIONARIO = ("tipo_propiedad", "tipo_transaccion", "departamento", "ciudad", "zona")
+COLUMNAR_FLAGS = ("piscina", "parqueo", "permite_mascotas")  # bit 0, 1, 2
+
+
+def inmueble_feature(inmueble):
+    imagenes_list = list(inmueble.imagenes.all())
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [float(inmueble.longitud), float(inmueble.latitud)],
+        },
+        "properties": {
+            "id": inmueble.id,
+            "titulo": inmueble.titulo,
+            "precio_usd": str(inmueble.precio_usd),
+            "precio_bs": str(inmueble.precio_bs),
+            "ciudad": inmueble.ciudad,
+            "zona": inmueble.zona,
+            "calle": inmueble.calle,
+            "cant_cuartos": inmueble.cant_cuartos,
+            "cant_banios": inmueble.cant_banios,
+            "piscina": inmueble.piscina,
+            "parqueo": inmueble.parqueo,
+            "permite_mascotas": inmueble.permite_mascotas,
+            "imagen_principal": imagenes_list[0].url if imagenes_list else None,
+            "imagenes": [img.url for img in imagenes_list],
+            "url_propiedad": inmueble.url_propiedad,
+            "area_construida": str(inmueble.area_construida),
+            "area_terreno": str(inmueble.area_terreno),
+            "tipo_propiedad": inmueble.tipo_propiedad.nombre,
+            "tipo_transaccion": inmueble.tipo_transaccion.nombre,
+            "departamento": inmueble.departamento.nombre,
+            "nombre_captador": inmueble.nombre_captador,
+            "celular_captacion": inmueble.celular_captacion,
+        },
+    }
+
+
+def marcador_feature(fila):
+    """Feature liviano para el mapa, construido desde ``marcadores_queryset``."""
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [float(fila["longitud"]), float(fila["latitud"])],
+        },
+        "properties": {
+            "id": fila["id"],
+            "precio_usd": str(fila["precio_usd"]),
+            "tipo_propiedad": fila["tipo_propiedad__nombre"],
+            "tipo_transaccion": fila["tipo_transaccion__nombre"],
+            "cant_cuartos": fila["cant_cuartos"],
+            "cant_banios": fila["cant_banios"],
+            "piscina": fila["piscina"],
+            "parqueo": fila["parqueo"],
+            "permite_mascotas": fila["permite_mascotas"],
+        },
+    }
+
+
+def _numero(valor):
+    valor = float(valor)
+    return int(valor) if valor.is_integer() else valor
+
+
+def a_columnar(data):
+    """
+    Convierte un FeatureCollection de inmuebles al formato columnar. Las
+    imágenes, la calle y los datos del captador no se incluyen: se cargan bajo
+    demanda al abrir el detalle.
+    """
+    features = data["features"]
+    props = [f["properties"] for f in features]
+    # Solo se codifican las columnas presentes (la vista de marcadores trae menos).
+    campos = set(props[0]) if props else set()
+    columnar = {k: v for k, v in data.items() if k not in ("type", "features")}
+    columnar.update({
+        "formato": "columnar",
+        "count": len(features),
+        "id": [p["id"] for p in props],
+        "lng": [f["geometry"]["coordinates"][0] for f in features],
+        "lat": [f["geometry"]["coordinates"][1] for f in features],
+        "flags": [
+            sum(1 << bit for bit, campo in enumerate(COLUMNAR_FLAGS) if p[campo])
+            for p in props
+        ],
+    })
+    if "titulo" in campos:
+        columnar["titulo"] = [p["titulo"] for p in props]
+    for campo in COLUMNAR_NUMERICAS:
+        if campo in campos:
+            columnar[campo] = [_numero(p[campo]) for p in props]
+
+    diccionarios = {}
+    for campo in COLUMNAR_DICCIONARIO:
+        if campo not in campos:
+            continue
+        valores, indices = [], {}
+        columna = []
+        for p in props:
+            valor = p[campo]
+            if valor not in indices:
+                indices[valor] = len(valores)
+                valores.append(valor)
+            columna.append(indices[valor])
+        diccionarios[campo] = valores
+        columnar[campo] = columna
+    columnar["diccionarios"] = diccionarios
+    columnar["flags_orden"] = list(COLUMNAR_FLAGS)
+    return columnar
+
+
+def detalle_queryset():
+    return (
+        Inmueble.objects
+        .select_related("tipo_propiedad", "tipo_transaccion", "departamento")
+        .prefetch_related("imagenes")
+    )
+
+
+def mapa_queryset():
+    return detalle_queryset().filter(activo=True, latitud__isnull=False, longitud__isnull=False)
+
+
+def marcadores_queryset():
+    return (
+        Inmueble.objects.filter(activo=True, latitud__isnull=False, longitud__isnull=False)
+        .values(
+            "id", "latitud", "longitud", "precio_usd", "tipo_propiedad__nombre",
+            "tipo_transaccion__nombre", "cant_cuartos", "cant_banios", "piscina",
+            "parqueo", "permite_mascotas",
+        )
+    )
+
+
+def bbox_radio(lat, lng, radio_m):
+    """Bbox (oeste, sur, este, norte) que contiene el círculo de radio_m metros."""
+    dlat = math.degrees(radio_m / RADIO_TIERRA_M)
+    dlng = math.degrees(radio_m / (RADIO_TIERRA_M * max(math.cos(math.radians(lat)), 1e-6)))
+    return lng - dlng, lat - dlat, lng + dlng, lat + dlat
+
+
+def distancia_haversine(lat, lng):
+    """Expresión SQL con la distancia en metros desde (lat, lng) a cada inmueble."""
+    lat_r, lng_r = math.radians(lat), math.radians(lng)
+    fila_lat = Radians(Cast(F("latitud"), FloatField()))
+    fila_lng = Radians(Cast(F("longitud"), FloatField()))
+    a = (
+        Power(Sin((fila_lat - lat_r) / 2), 2)
+        + math.cos(lat_r) * Cos(fila_lat) * Power(Sin((fila_lng - lng_r) / 2), 2)
+    )
+    return 2 * RADIO_TIERRA_M * ASin(Sqrt(a))
+
+
+# vista -> (clave de caché del feed completo, queryset, constructor del feature)
+MAPA_VISTAS = {
+    "completa": (MAPA_CACHE_KEY, mapa_queryset, inmueble_feature),
+    "marcadores": (MAPA_MARCADORES_CACHE_KEY, marcadores_queryset, marcador_feature),
+}
+
+
+def _item_key(vista, pk):
+    return f"{MAPA_ITEM_KEY}:{vista}:{pk}"
+
+
+def _indice_key(vista):
+    return f"{MAPA_INDICE_KEY}:{vista}"
+
+
+def _features_por_id(vista, ids=None):
+    _, queryset, feature = MAPA_VISTAS[vista]
+    qs = queryset()
+    if ids is not None:
+        qs = qs.filter(pk__in=ids)
+    features = (feature(fila) for fila in qs)
+    return {f["properties"]["id"]: f for f in features}
+
+
+def _ultimos(features, limite):
+    return [features[pk] for pk in sorted(features, reverse=True)[:limite]]
+
+
+def features_mapa(vista, limite=MAPA_LIMITE):
+    """
+    Features del feed completo (los ``limite`` más nuevos), armados desde el
+    almacén por inmueble. Si el índice o algún item falta, se reconstruye
+    desde la base.
+    """
+    indice_key = _indice_key(vista)
+    try:
+        indice = cache.get(indice_key)
+        if indice is not None:
+            keys = [_item_key(vista, pk) for pk in sorted(indice, reverse=True)[:limite]]
+            items = cache.get_many(keys)
+            if len(items) == len(keys):
+                return [items[key] for key in keys]
+    except Exception:
+        return _ultimos(_features_por_id(vista), limite)
+
+    inicio = time.time()
+    features = _features_por_id(vista)
+    try:
+        cache.set_many({_item_key(vista, pk): f for pk, f in features.items()}, MAPA_ALMACEN_TTL)
+        cache.set(indice_key, set(features), MAPA_ALMACEN_TTL)
+        # Si un parche llegó mientras se leía la base, esta copia puede no
+        # incluirlo: se descarta el índice y la próxima lectura reconstruye.
+        if (cache.get(f"{indice_key}:cambio") or 0) >= inicio:
+            cache.delete(indice_key)
+    except Exception:
+        pass
+    return _ultimos(features, limite)
+
+
+def _parchear_indice(vista, agregar, quitar):
+    indice_key = _indice_key(vista)
+    lock_key = f"{indice_key}:lock"
+    for _ in range(50):
+        if cache.add(lock_key, 1, 5):
+            try:
+                indice = cache.get(indice_key)
+                if indice is not None:
+                    cache.set(indice_key, (indice | agregar) - quitar, MAPA_ALMACEN_TTL)
+            finally:
+                cache.delete(lock_key)
+            return
+        time.sleep(0.01)
+    # Sin lock no hay parche seguro: se fuerza la reconstrucción completa.
+    cache.delete(indice_key)
+
+
+_diferido = threading.local()
+
+
+@contextmanager
+def actualizacion_diferida():
+    """
+    Junta los ``actualizar_en_mapa`` del bloque (incluidos los de señales) y
+    los aplica en un solo parche al salir. Pensado para envolver una
+    transacción de ingesta: el parche se hace después del commit.
+    """
+    if getattr(_diferido, "ids", None) is not None:
+        yield
+        return
+    _diferido.ids = set()
+    try:
+        yield
+    finally:
+        ids, _diferido.ids = _diferido.ids, None
+        if ids:
+            actualizar_en_mapa(ids)
+
+
+def actualizar_en_mapa(ids):
+    """
+    Parchea el almacén del mapa para los inmuebles ``ids``: inserta o
+    actualiza los que siguen activos con coordenadas y quita el resto
+    (desactivados o borrados). Después cambia la versión del mapa.
+    """
+    ids = set(ids)
+    pendientes = getattr(_diferido, "ids", None)
+    if pendientes is not None:
+        pendientes.update(ids)
+        return
+    try:
+        for vista in MAPA_VISTAS:
+            indice_key = _indice_key(vista)
+            cache.set(f"{indice_key}:cambio", time.time(), MAPA_ALMACEN_TTL)
+            features = _features_por_id(vista, ids)
+            quitar = ids - set(features)
+            cache.set_many({_item_key(vista, pk): f for pk, f in features.items()}, MAPA_ALMACEN_TTL)
+            _parchear_indice(vista, set(features), quitar)
+            cache.delete_many([_item_key(vista, pk) for pk in quitar])
+    except Exception:
+        logger.exception("Error parcheando el almacén del mapa")
+    invalidar_mapa()
+
+
+def codificar_payload(cuerpo):
+    """Variantes ya comprimidas de un cuerpo JSON, listas para cachear."""
+    return {
+        "identity": cuerpo,
+        "gzip": gzip.compress(cuerpo, compresslevel=6, mtime=0),
+        "br": brotli.compress(cuerpo, quality=9) if brotli is not None else None,
+    }
+
+
+def elegir_codificacion(accept_encoding, payload):
+    """Elige br, gzip o identity según el header Accept-Encoding del cliente."""
+    aceptadas = set()
+    for parte in accept_encoding.split(","):
+        nombre, _, params = parte.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        aceptadas.add(nombre.strip().lower())
+    if payload["br"] is not None and "br" in aceptadas:
+        return "br"
+    if "gzip" in aceptadas or "*" in aceptadas:
+        return "gzip"
+    return "identity"
+
+
+def _construir_entrada(version, construir):
+    inicio = time.monotonic()
+    payload = construir()
+    return {
+        "version": version,
+        "payload": payload,
+        "delta": time.monotonic() - inicio,
+        "expira": time.time() + MAPA_CACHE_TTL,
+    }
+
+
+def _vigente(entrada, version):
+    if entrada is None or entrada["version"]["token"] != version["token"]:
+        return False
+    # Expiración probabilística temprana (XFetch): cuanto más caro fue
+    # construirlo y más cerca está de expirar, más probable es refrescarlo ya.
+    temprano = -entrada["delta"] * MAPA_XFETCH_BETA * math.log(1 - random.random())
+    return time.time() + temprano < entrada["expira"]
+
+
+def _regenerar(cache_key, lock_key, version, construir, ttl):
+    try:
+        entrada = _construir_entrada(version, construir)
+        cache.set(cache_key, entrada, ttl)
+        return entrada
+    finally:
+        cache.delete(lock_key)
+
+
+def refrescar_en_segundo_plano(funcion):
+    def ejecutar():
+        try:
+            funcion()
+        except Exception:
+            logger.exception("Error regenerando el payload del mapa")
+        finally:
+            connection.close()
+
+    threading.Thread(target=ejecutar, daemon=True).start()
+
+
+def obtener_payload(cache_key, version, construir, ttl=MAPA_STALE_TTL):
+    """
+    Devuelve la entrada cacheada ``{"version", "payload", ...}`` de cache_key,
+    regenerándola con ``construir()`` sin estampidas: solo el worker que toma
+    el lock reconstruye; los demás sirven la copia anterior (aunque sea de
+    otra versión) o, si no hay ninguna, esperan a que aparezca. La entrada se
+    conserva ``ttl`` segundos.
+    """
+    try:
+        entrada = cache.get(cache_key)
+    except Exception:
+        return _construir_entrada(version, construir)
+    if _vigente(entrada, version):
+        return entrada
+
+    lock_key = f"{cache_key}:lock"
+    if cache.add(lock_key, 1, MAPA_LOCK_TTL):
+        # Si el catálogo cambió, quien toma el lock reconstruye en primer
+        # plano; si solo venció el TTL, sirve la copia y refresca en segundo.
+        if entrada is None or entrada["version"]["token"] != version["token"]:
+            return _regenerar(cache_key, lock_key, version, construir, ttl)
+        refrescar_en_segundo_plano(lambda: _regenerar(cache_key, lock_key, version, construir, ttl))
+        return entrada
+    if entrada is not None:
+        return entrada
+
+    limite = time.monotonic() + MAPA_LOCK_ESPERA
+    while time.monotonic() < limite:
+        time.sleep(0.05)
+        entrada = cache.get(cache_key)
+        if entrada is not None:
+            return entrada
+    return _construir_entrada(version, construir)
+
+
+def _nueva_version():
+    return {"token": uuid.uuid4().hex, "modificado": int(time.time())}
+
+
+def version_mapa():
+    """
+    Versión del catálogo del mapa: un token aleatorio (base de ETag y de las
+    claves de caché por bbox) y el timestamp de la última modificación.
+    """
+    try:
+        version = cache.get(MAPA_VERSION_KEY)
+        if version is None:
+            version = _nueva_version()
+            if not cache.add(MAPA_VERSION_KEY, version, None):
+                version = cache.get(MAPA_VERSION_KEY) or version
+    except Exception:
+        version = _nueva_version()
+    return version
+
+
+def invalidar_mapa():
+    try:
+        cache.set(MAPA_VERSION_KEY, _nueva_version(), None)
+    except Exception:
+        pass
+
+
+def calcular_clusters(zoom):
+    """
+    Agrupa los inmuebles activos en una grilla cuyo tamaño de celda equivale a
+    ``MAPA_CLUSTER_CELDA_PX`` píxeles en el zoom dado. Devuelve una lista de
+    features GeoJSON con conteo, centroide y precio mín/mediana/máx.
+    """
+    celda = 360 / (256 * 2 ** zoom) * MAPA_CLUSTER_CELDA_PX
+    celdas = defaultdict(list)
+    filas = (
+        Inmueble.objects.filter(activo=True, latitud__isnull=False, longitud__isnull=False)
+        .values_list("latitud", "longitud", "precio_usd")
+    )
+    for lat, lng, precio in filas.iterator():
+        lat, lng = float(lat), float(lng)
+        clave = (math.floor(lng / celda), math.floor(lat / celda))
+        celdas[clave].append((lat, lng, float(precio)))
+
+    expansion_zoom = min(zoom + 2, MAPA_CLUSTER_ZOOM_MAX + 1)
+    features = []
+    for puntos in celdas.values():
+        precios = [p for _, _, p in puntos]
+        features.append({
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [
+                    round(sum(lng for _, lng, _ in puntos) / len(puntos), 6),
+                    round(sum(lat for lat, _, _ in puntos) / len(puntos), 6),
+                ],
+            },
+            "properties": {
+                "cluster": True,
+                "count": len(puntos),
+                "precio_usd_min": min(precios),
+                "precio_usd_mediana": statistics.median(precios),
+                "precio_usd_max": max(precios),
+                "expansion_zoom": expansion_zoom,
+            },
+        })
+    return features
+
+
+def clusters_por_zoom(zoom, version=None):
+    """Clusters precalculados del zoom, cacheados por versión del mapa."""
+    version = version or version_mapa()
+    cache_key = f"{MAPA_CLUSTER_CACHE_KEY}:{version['token']}:{zoom}"
+    try:
+        features = cache.get(cache_key)
+    except Exception:
+        features = None
+    if features is None:
+        features = calcular_clusters(zoom)
+        try:
+            cache.set(cache_key, features, MAPA_CLUSTER_TTL)
+        except Exception:
+            pass
+    return features
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0005_inmueble_empresa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(fields=['latitud', 'longitud'], name='inmueble_lat_lng_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0006_inmueble_lat_lng_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(fields=['activo', 'tipo_transaccion', 'precio_usd', 'cant_cuartos', 'cant_banios'], name='inmueble_busqueda_idx'),
+        ),
+    ]
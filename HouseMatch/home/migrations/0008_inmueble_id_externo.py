@@ -0,0 +1,37 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0007_inmueble_busqueda_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inmueble',
+            name='fuente',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='inmueble',
+            name='hash_contenido',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='inmueble',
+            name='id_externo',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='inmueble',
+            name='ultimo_visto',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='inmueble',
+            constraint=models.UniqueConstraint(condition=models.Q(('id_externo__isnull', False)), fields=('fuente', 'id_externo'), name='inmueble_fuente_id_externo_uniq'),
+        ),
+    ]
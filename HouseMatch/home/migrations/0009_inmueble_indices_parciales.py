@@ -0,0 +1,37 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0008_inmueble_id_externo'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inmueble',
+            name='inmueble_lat_lng_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='inmueble',
+            name='inmueble_busqueda_idx',
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(condition=models.Q(('activo', True), ('latitud__isnull', False), ('longitud__isnull', False)), fields=['-id'], name='inmueble_publicados_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(condition=models.Q(('activo', True), ('latitud__isnull', False), ('longitud__isnull', False)), fields=['latitud', 'longitud'], name='inmueble_mapa_bbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(condition=models.Q(('activo', True), ('latitud__isnull', False), ('longitud__isnull', False)), fields=['precio_usd'], name='inmueble_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['fuente', 'ultimo_visto'], name='inmueble_fuente_visto_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# Copia fija del DDL de ``home.espacial`` al momento de esta migración: si el
+# módulo cambia, esta migración sigue creando lo mismo.
+SQLITE_CREAR = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS home_inmueble_rtree USING rtree(id, lat_min, lat_max, lng_min, lng_max)",
+    """CREATE TRIGGER IF NOT EXISTS home_inmueble_rtree_ai AFTER INSERT ON home_inmueble
+        WHEN NEW.activo AND NEW.latitud IS NOT NULL AND NEW.longitud IS NOT NULL
+        BEGIN
+            INSERT INTO home_inmueble_rtree VALUES (NEW.id, NEW.latitud, NEW.latitud, NEW.longitud, NEW.longitud);
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS home_inmueble_rtree_au
+        AFTER UPDATE OF activo, latitud, longitud ON home_inmueble
+        BEGIN
+            DELETE FROM home_inmueble_rtree WHERE id = OLD.id;
+            INSERT INTO home_inmueble_rtree
+                SELECT NEW.id, NEW.latitud, NEW.latitud, NEW.longitud, NEW.longitud
+                WHERE NEW.activo AND NEW.latitud IS NOT NULL AND NEW.longitud IS NOT NULL;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS home_inmueble_rtree_ad AFTER DELETE ON home_inmueble
+        BEGIN
+            DELETE FROM home_inmueble_rtree WHERE id = OLD.id;
+        END""",
+    "DELETE FROM home_inmueble_rtree",
+    "INSERT INTO home_inmueble_rtree SELECT id, latitud, latitud, longitud, longitud "
+    "FROM home_inmueble WHERE activo AND latitud IS NOT NULL AND longitud IS NOT NULL",
+]
+SQLITE_BORRAR = [
+    "DROP TRIGGER IF EXISTS home_inmueble_rtree_ai",
+    "DROP TRIGGER IF EXISTS home_inmueble_rtree_au",
+    "DROP TRIGGER IF EXISTS home_inmueble_rtree_ad",
+    "DROP TABLE IF EXISTS home_inmueble_rtree",
+]
+POSTGRES_CREAR = [
+    "CREATE INDEX IF NOT EXISTS inmueble_punto_gist ON home_inmueble "
+    "USING gist (point(longitud::float8, latitud::float8)) "
+    "WHERE activo AND latitud IS NOT NULL AND longitud IS NOT NULL",
+]
+POSTGRES_BORRAR = [
+    "DROP INDEX IF EXISTS inmueble_punto_gist",
+]
+
+
+def _ejecutar(schema_editor, por_motor):
+    for sql in por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def crear(apps, schema_editor):
+    _ejecutar(schema_editor, {"sqlite": SQLITE_CREAR, "postgresql": POSTGRES_CREAR})
+
+
+def borrar(apps, schema_editor):
+    _ejecutar(schema_editor, {"sqlite": SQLITE_BORRAR, "postgresql": POSTGRES_BORRAR})
+
+
+class Migration(migrations.Migration):
+    """
+    Índice espacial fuera del ORM (ver ``home.espacial``): GiST en
+    PostgreSQL, R*Tree con triggers en SQLite. Otros motores no crean nada
+    y las búsquedas por radio usan el índice de latitud/longitud.
+    """
+
+    dependencies = [
+        ('home', '0009_inmueble_indices_parciales'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear, borrar),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.10 on 2026-10-17 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0010_inmueble_indice_espacial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaZona',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField()),
+                ('ciudad', models.CharField(max_length=100)),
+                ('zona', models.CharField(max_length=100)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('p25_m2', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('mediana_m2', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('p75_m2', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('tendencia_pct', models.DecimalField(blank=True, decimal_places=2, max_digits=7, null=True)),
+                ('actualizada_en', models.DateTimeField(auto_now=True)),
+                ('tipo_propiedad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='home.tipopropiedad')),
+                ('tipo_transaccion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='home.tipotransaccion')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('periodo', 'ciudad', 'zona', 'tipo_propiedad', 'tipo_transaccion'), name='estadistica_zona_uniq')],
+            },
+        ),
+    ]
@@ -63,6 +63,9 @@ class Departamento(models.Model):
         return self.nombre
 
 
+PUBLICADOS = models.Q(activo=True, latitud__isnull=False, longitud__isnull=False)
+
+
 class Inmueble(models.Model):
     # Relaciones (sin asesor FK)
     empresa = models.ForeignKey(Empresa, on_delete=models.SET_NULL, null=True, blank=True)
@@ -102,6 +105,31 @@ class Inmueble(models.Model):
     permite_mascotas = models.BooleanField(default=False)
     activo = models.BooleanField(default=True)
 
+    # Origen (scraping): clave externa para reingestas idempotentes
+    fuente = models.CharField(max_length=30, blank=True, default='')
+    id_externo = models.CharField(max_length=100, null=True, blank=True)
+    hash_contenido = models.CharField(max_length=64, blank=True, default='')
+    ultimo_visto = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fuente', 'id_externo'],
+                condition=models.Q(id_externo__isnull=False),
+                name='inmueble_fuente_id_externo_uniq',
+            ),
+        ]
+        # Parciales sobre lo que muestran el mapa y la búsqueda: activos con
+        # coordenadas (ver mapa.mapa_queryset). Auditar con `auditar_consultas`.
+        indexes = [
+            models.Index(fields=['-id'], condition=PUBLICADOS, name='inmueble_publicados_idx'),
+            models.Index(fields=['latitud', 'longitud'], condition=PUBLICADOS, name='inmueble_mapa_bbox_idx'),
+            models.Index(fields=['precio_usd'], condition=PUBLICADOS, name='inmueble_precio_idx'),
+            models.Index(
+                fields=['fuente', 'ultimo_visto'], condition=models.Q(activo=True), name='inmueble_fuente_visto_idx'
+            ),
+        ]
+
     @property
     def imagen_principal(self):
         img = self.imagenes.first()
@@ -156,3 +184,34 @@ class InmuebleGuardado(models.Model):
 
     def __str__(self):
         return f"{self.etiqueta.nombre} → {self.inmueble.titulo}"
+
+
+class EstadisticaZona(models.Model):
+    """
+    Precio USD/m² de los inmuebles publicados por (ciudad, zona, tipo,
+    transacción), una fila por mes. La del mes en curso se recalcula al
+    ingestar (ver ``home.estadisticas``); las anteriores quedan como historia
+    para la tendencia.
+    """
+    periodo = models.DateField()  # primer día del mes
+    ciudad = models.CharField(max_length=100)
+    zona = models.CharField(max_length=100)
+    tipo_propiedad = models.ForeignKey(TipoPropiedad, on_delete=models.CASCADE)
+    tipo_transaccion = models.ForeignKey(TipoTransaccion, on_delete=models.CASCADE)
+    cantidad = models.PositiveIntegerField()
+    p25_m2 = models.DecimalField(max_digits=12, decimal_places=2)
+    mediana_m2 = models.DecimalField(max_digits=12, decimal_places=2)
+    p75_m2 = models.DecimalField(max_digits=12, decimal_places=2)
+    tendencia_pct = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
+    actualizada_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['periodo', 'ciudad', 'zona', 'tipo_propiedad', 'tipo_transaccion'],
+                name='estadistica_zona_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.zona}, {self.ciudad} · {self.tipo_propiedad} {self.tipo_transaccion} ({self.periodo:%Y-%m})"
@@ -0,0 +1,12 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Variante negociable del GeoJSON del mapa: arrays por columna en lugar de
+    un objeto por feature. Se pide con ``Accept: application/vnd.housematch.columnar+json``
+    o ``?format=columnar``; la vista convierte los datos con ``a_columnar``.
+    """
+
+    media_type = 'application/vnd.housematch.columnar+json'
+    format = 'columnar'
@@ -1,28 +1,41 @@
+from django.db import transaction
+from django.utils.encoding import smart_str
 from rest_framework import serializers
 
-from .models import Departamento, Empresa, ImagenInmueble, Inmueble, TipoPropiedad, TipoTransaccion
+from . import catalogo
+from .models import (
+    Departamento, Empresa, EstadisticaZona, ImagenInmueble, Inmueble, TipoPropiedad, TipoTransaccion,
+)
 
 
-class SlugGetOrCreateField(serializers.SlugRelatedField):
+class CatalogoField(serializers.SlugRelatedField):
+    """SlugRelatedField por nombre resuelto desde ``home.catalogo``, sin consultas."""
+    crear = False
+
     def to_internal_value(self, data):
-        try:
-            obj, _ = self.get_queryset().get_or_create(**{self.slug_field: data})
-            return obj
-        except (TypeError, ValueError):
+        if isinstance(data, (dict, list, bool)):
             self.fail('invalid')
+        obj = catalogo.obtener(self.get_queryset().model, smart_str(data), crear=self.crear)
+        if obj is None:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=smart_str(data))
+        return obj
+
+
+class SlugGetOrCreateField(CatalogoField):
+    crear = True
 
 
 class InmuebleCreateSerializer(serializers.ModelSerializer):
-    empresa = serializers.SlugRelatedField(
+    empresa = CatalogoField(
         queryset=Empresa.objects.all(), slug_field='nombre', required=False, allow_null=True
     )
     tipo_propiedad = SlugGetOrCreateField(
         queryset=TipoPropiedad.objects.all(), slug_field='nombre'
     )
-    tipo_transaccion = serializers.SlugRelatedField(
+    tipo_transaccion = CatalogoField(
         queryset=TipoTransaccion.objects.all(), slug_field='nombre'
     )
-    departamento = serializers.SlugRelatedField(
+    departamento = CatalogoField(
         queryset=Departamento.objects.all(), slug_field='nombre'
     )
     imagenes = serializers.ListField(
@@ -60,6 +73,8 @@ class InmuebleCreateSerializer(serializers.ModelSerializer):
             "piscina",
             "permite_mascotas",
             "activo",
+            "fuente",
+            "id_externo",
             "imagenes",
         ]
 
@@ -87,10 +102,34 @@ class InmuebleCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         imagenes_urls = validated_data.pop("imagenes", [])
         if validated_data.get("empresa") is None:
-            validated_data["empresa"] = Empresa.objects.filter(nombre__icontains="century").first()
-        inmueble = Inmueble.objects.create(**validated_data)
-        ImagenInmueble.objects.bulk_create([
-            ImagenInmueble(inmueble=inmueble, url=url, orden=i)
-            for i, url in enumerate(imagenes_urls)
-        ])
+            validated_data["empresa"] = catalogo.empresa_defecto()
+        # En una transacción: el post_save parchea el mapa al commit, ya con
+        # las imágenes (bulk_create no dispara señales).
+        with transaction.atomic():
+            inmueble = Inmueble.objects.create(**validated_data)
+            ImagenInmueble.objects.bulk_create([
+                ImagenInmueble(inmueble=inmueble, url=url, orden=i)
+                for i, url in enumerate(imagenes_urls)
+            ])
         return inmueble
+
+
+class EstadisticaZonaSerializer(serializers.ModelSerializer):
+    tipo_propiedad = serializers.SlugRelatedField(slug_field='nombre', read_only=True)
+    tipo_transaccion = serializers.SlugRelatedField(slug_field='nombre', read_only=True)
+
+    class Meta:
+        model = EstadisticaZona
+        fields = [
+            "periodo",
+            "ciudad",
+            "zona",
+            "tipo_propiedad",
+            "tipo_transaccion",
+            "cantidad",
+            "p25_m2",
+            "mediana_m2",
+            "p75_m2",
+            "tendencia_pct",
+            "actualizada_en",
+        ]
@@ -0,0 +1,91 @@
+import threading
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import catalogo, estadisticas
+from .espacial import reparar_indice_espacial
+from .mapa import actualizar_en_mapa
+from .models import Departamento, Empresa, ImagenInmueble, Inmueble, TipoPropiedad, TipoTransaccion
+
+_grupos = threading.local()
+
+
+def _recalcular_pendientes():
+    grupos, _grupos.pendientes = getattr(_grupos, "pendientes", set()), set()
+    estadisticas.recalcular(grupos)
+
+
+def _recalcular_al_confirmar(grupos):
+    """
+    Junta los grupos tocados en la transacción y los recalcula en un solo
+    ``on_commit``: un borrado masivo recalcula una vez, no una por fila. Los
+    de una transacción revertida se recalculan con la siguiente, sin daño.
+    """
+    if getattr(_grupos, "pendientes", None) is None:
+        _grupos.pendientes = set()
+    _grupos.pendientes.update(grupos)
+    conexion = transaction.get_connection()
+    if not any(hook is _recalcular_pendientes for _, hook, _ in conexion.run_on_commit):
+        transaction.on_commit(_recalcular_pendientes)
+
+
+@receiver(pre_save, sender=Inmueble)
+def inmueble_por_guardar(sender, instance, raw=False, **kwargs):
+    """Recuerda el grupo de estadísticas del inmueble antes de la edición."""
+    instance._grupo_anterior = None
+    if not raw and instance.pk is not None:
+        instance._grupo_anterior = (
+            Inmueble.objects.filter(pk=instance.pk).values_list(*estadisticas.CAMPOS_CLAVE).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Inmueble)
+def inmueble_modificado(sender, instance, **kwargs):
+    """
+    Altas, ediciones (admin incluido), bajas y borrados parchean el almacén
+    del mapa, cambian su versión y recalculan las estadísticas de su grupo
+    (y del anterior, si la edición cambió zona o tipo). Todo después del
+    commit: antes, otro pedido podría cachear las filas viejas con la
+    versión nueva, y un rollback dejaría datos que no existen.
+    """
+    ids = [instance.pk]  # después del borrado la instancia ya no tiene pk
+    transaction.on_commit(lambda: actualizar_en_mapa(ids))
+    if not kwargs.get("raw"):
+        grupos = {estadisticas.clave(instance)}
+        if getattr(instance, "_grupo_anterior", None):
+            grupos.add(instance._grupo_anterior)
+        _recalcular_al_confirmar(grupos)
+
+
+@receiver([post_save, post_delete], sender=ImagenInmueble)
+def imagen_modificada(sender, instance, **kwargs):
+    ids = [instance.inmueble_id]
+    transaction.on_commit(lambda: actualizar_en_mapa(ids))
+
+
+@receiver([post_save, post_delete], sender=TipoPropiedad)
+@receiver([post_save, post_delete], sender=TipoTransaccion)
+@receiver([post_save, post_delete], sender=Departamento)
+@receiver([post_save, post_delete], sender=Empresa)
+def catalogo_modificado(sender, **kwargs):
+    catalogo.invalidar(sender)
+
+
+@receiver(connection_created)
+def configurar_sqlite(sender, connection, **kwargs):
+    """Aplica ``settings.SQLITE_PRAGMAS`` a cada conexión SQLite nueva."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for pragma, valor in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {pragma} = {valor}")
+
+
+@receiver(post_migrate)
+def indice_espacial_migrado(sender, using, **kwargs):
+    if sender.name == "home":
+        reparar_indice_espacial(connections[using])
@@ -1,7 +1,13 @@
 from django.urls import path
 
 from .api_views import (
+    EstadisticaZonaAPIView,
+    InmuebleBuscarAPIView,
+    InmuebleCercanosAPIView,
     InmuebleCreateAPIView,
+    InmuebleDetalleAPIView,
+    InmuebleLoteAPIView,
+    InmuebleLoteDesactivarAPIView,
     InmuebleMapGeoJSONAPIView,
     EtiquetaListCreateAPIView,
     EtiquetaDestroyAPIView,
@@ -24,7 +30,13 @@ urlpatterns = [
     path('inmuebles/<int:pk>/', detalle_inmueble, name='detalle_inmueble'),
     path('api/token/', ObtenerTokenView.as_view(), name='api_token'),
     path('api/inmuebles/', InmuebleCreateAPIView.as_view(), name='api_inmueble_create'),
+    path('api/inmuebles/lote/', InmuebleLoteAPIView.as_view(), name='api_inmueble_lote'),
+    path('api/inmuebles/lote/desactivar/', InmuebleLoteDesactivarAPIView.as_view(), name='api_inmueble_lote_desactivar'),
     path('api/inmuebles/mapa/', InmuebleMapGeoJSONAPIView.as_view(), name='api_inmueble_mapa'),
+    path('api/inmuebles/buscar/', InmuebleBuscarAPIView.as_view(), name='api_inmueble_buscar'),
+    path('api/inmuebles/cercanos/', InmuebleCercanosAPIView.as_view(), name='api_inmueble_cercanos'),
+    path('api/inmuebles/detalle/', InmuebleDetalleAPIView.as_view(), name='api_inmueble_detalle'),
+    path('api/estadisticas/zonas/', EstadisticaZonaAPIView.as_view(), name='api_estadisticas_zonas'),
     path('api/etiquetas/', EtiquetaListCreateAPIView.as_view(), name='api_etiqueta_list_create'),
     path('api/etiquetas/<int:pk>/', EtiquetaDestroyAPIView.as_view(), name='api_etiqueta_destroy'),
     path('api/etiquetas/<int:etiqueta_id>/guardados/', InmuebleGuardadoListCreateAPIView.as_view(), name='api_guardado_list_create'),
@@ -2,7 +2,8 @@ from django.contrib.auth import authenticate, login as auth_login, logout as aut
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 
-from .models import Empresa, Etiqueta, Inmueble, PerfilAsesor, Usuario
+from .mapa import detalle_queryset
+from .models import Empresa, Etiqueta, PerfilAsesor, Usuario
 
 
 def home(request):
@@ -129,11 +130,5 @@ def logout(request):
 
 
 def detalle_inmueble(request, pk):
-    inmueble = get_object_or_404(
-        Inmueble.objects
-        .select_related('tipo_propiedad', 'tipo_transaccion', 'departamento')
-        .prefetch_related('imagenes'),
-        pk=pk,
-        activo=True,
-    )
+    inmueble = get_object_or_404(detalle_queryset(), pk=pk, activo=True)
     return render(request, 'home/inmueble_detalle.html', {'inmueble': inmueble})
@@ -0,0 +1,172 @@
+"""
+Selección automática de comparables para el ACM.
+
+Los inmuebles publicados con precio y área se cargan una vez por proceso
+como columnas NumPy (se recargan cuando cambia ``version_mapa``). Para un
+sujeto se filtran por transacción y tipo de propiedad y se puntúan todos a
+la vez: cada término es una diferencia normalizada (1 ≈ "bastante
+distinto") y el puntaje es su suma ponderada; los ``k`` de menor puntaje son
+los comparables. Las filas elegidas se leen de la base con el formato de
+``/api/inmuebles/detalle/``, que es lo que ``acm_generar`` recibe del mapa.
+"""
+import math
+
+import numpy as np
+
+from home import catalogo
+from home.catalogo import normalizar
+from home.mapa import RADIO_TIERRA_M, detalle_queryset, inmueble_feature, mapa_queryset, version_mapa
+from home.models import TipoPropiedad, TipoTransaccion
+
+COMPARABLES_K = 3
+COMPARABLES_K_MAX = 20
+COMPARABLES_RADIO_MAX = 15000  # metros, solo si el sujeto trae ubicación
+
+# Peso de cada término del puntaje.
+PESOS = {
+    "area": 1.0,  # |ln(área / área del sujeto)| / ln(1.5)
+    "precio_m2": 0.7,  # |ln(USD/m² / referencia)| / ln(1.5)
+    "distancia": 1.0,  # km / 2
+    "zona": 0.5,  # otra zona (sin ubicación pesa el doble)
+    "cuartos": 0.4,  # por habitación de diferencia
+    "banios": 0.3,  # por baño de diferencia
+    "amenidades": 0.2,  # por amenidad distinta
+}
+AMENIDADES = ("parqueo", "piscina", "permite_mascotas")
+
+_COLUMNAS = (
+    "id", "tipo_propiedad_id", "tipo_transaccion_id", "latitud", "longitud", "area_construida",
+    "cant_cuartos", "cant_banios", "precio_usd", *AMENIDADES, "zona",
+)
+
+_cargados = {}  # "candidatos" -> (version, {columna: array})
+
+
+def candidatos():
+    """Columnas de los inmuebles publicados con precio y área (cache en proceso)."""
+    version = version_mapa()
+    entrada = _cargados.get("candidatos")
+    if entrada is not None and entrada[0] == version:
+        return entrada[1]
+    filas = list(
+        mapa_queryset().filter(precio_usd__gt=0, area_construida__gt=0)
+        .order_by().values_list(*_COLUMNAS)
+    )
+    columnas = dict(zip(_COLUMNAS, zip(*filas))) if filas else dict.fromkeys(_COLUMNAS, ())
+    datos = {
+        "id": np.array(columnas["id"], dtype=np.int64),
+        "tipo_propiedad_id": np.array(columnas["tipo_propiedad_id"], dtype=np.int64),
+        "tipo_transaccion_id": np.array(columnas["tipo_transaccion_id"], dtype=np.int64),
+        "zona": np.array([normalizar(z) for z in columnas["zona"]], dtype=object),
+    }
+    for campo in ("latitud", "longitud", "area_construida", "precio_usd", "cant_cuartos", "cant_banios"):
+        datos[campo] = np.array(columnas[campo], dtype=np.float64)
+    for campo in AMENIDADES:
+        datos[campo] = np.array(columnas[campo], dtype=bool)
+    _cargados["candidatos"] = (version, datos)
+    return datos
+
+
+def _numero(valor):
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None
+    return numero if math.isfinite(numero) else None
+
+
+def _bool(valor):
+    if isinstance(valor, str):
+        return valor.lower() in ("1", "true", "si", "sí", "on")
+    return bool(valor)
+
+
+def _ids_por_nombre(modelo, nombre):
+    return [obj.pk for obj in catalogo.buscar(modelo, nombre)]
+
+
+def puntuar(datos, sujeto):
+    """
+    Puntaje de cada candidato de ``datos`` contra ``sujeto`` (menor = más
+    parecido) y la distancia en metros (NaN si el sujeto no tiene ubicación).
+    """
+    n = len(datos["id"])
+    puntaje = np.zeros(n)
+    area = _numero(sujeto.get("area_construida"))
+    precio_m2 = datos["precio_usd"] / datos["area_construida"]
+    if area and area > 0:
+        puntaje += PESOS["area"] * np.abs(np.log(datos["area_construida"] / area)) / math.log(1.5)
+        # Referencia de USD/m²: el precio del propietario si lo hay; si no, la
+        # mediana de los candidatos (castiga publicaciones con precios atípicos).
+        precio = _numero(sujeto.get("precio_propietario_usd"))
+        referencia = precio / area if precio and precio > 0 else None
+    else:
+        referencia = None
+    if referencia is None and n:
+        referencia = float(np.median(precio_m2))
+    if referencia:
+        puntaje += PESOS["precio_m2"] * np.abs(np.log(precio_m2 / referencia)) / math.log(1.5)
+
+    lat, lng = _numero(sujeto.get("latitud")), _numero(sujeto.get("longitud"))
+    distancia = np.full(n, np.nan)
+    if lat is not None and lng is not None:
+        lat_r, lng_r = math.radians(lat), math.radians(lng)
+        fila_lat, fila_lng = np.radians(datos["latitud"]), np.radians(datos["longitud"])
+        a = (
+            np.sin((fila_lat - lat_r) / 2) ** 2
+            + math.cos(lat_r) * np.cos(fila_lat) * np.sin((fila_lng - lng_r) / 2) ** 2
+        )
+        distancia = 2 * RADIO_TIERRA_M * np.arcsin(np.sqrt(a))
+        puntaje += PESOS["distancia"] * distancia / 2000
+    zona = normalizar(sujeto.get("zona"))
+    if zona:
+        peso = PESOS["zona"] * (1 if lat is not None and lng is not None else 2)
+        puntaje += peso * (datos["zona"] != zona)
+
+    for campo, peso in (("cant_cuartos", PESOS["cuartos"]), ("cant_banios", PESOS["banios"])):
+        valor = _numero(sujeto.get(campo))
+        if valor is not None:
+            puntaje += peso * np.abs(datos[campo] - valor)
+    for campo in AMENIDADES:
+        puntaje += PESOS["amenidades"] * (datos[campo] != _bool(sujeto.get(campo)))
+    return puntaje, distancia
+
+
+def buscar_comparables(sujeto, k=COMPARABLES_K, radio_max=COMPARABLES_RADIO_MAX):
+    """
+    Los ``k`` inmuebles más parecidos a ``sujeto`` (dict con los campos del
+    formulario del ACM; ``latitud``/``longitud`` opcionales). Cada uno trae
+    las propiedades de ``inmueble_feature`` más ``similitud`` (0–1),
+    ``precio_m2`` y ``distancia_m`` (si el sujeto tiene ubicación).
+    """
+    datos = candidatos()
+    transacciones = _ids_por_nombre(TipoTransaccion, sujeto.get("tipo_transaccion"))
+    mascara = np.isin(datos["tipo_transaccion_id"], transacciones)
+    if sujeto.get("tipo_propiedad"):
+        tipos = _ids_por_nombre(TipoPropiedad, sujeto["tipo_propiedad"])
+        mascara &= np.isin(datos["tipo_propiedad_id"], tipos)
+    filtrados = {campo: columna[mascara] for campo, columna in datos.items()}
+
+    puntaje, distancia = puntuar(filtrados, sujeto)
+    if not np.isnan(distancia).all():
+        puntaje = np.where(distancia <= radio_max, puntaje, np.inf)
+    k = min(k, int(np.isfinite(puntaje).sum()))
+    if k <= 0:
+        return []
+    mejores = np.argpartition(puntaje, k - 1)[:k]
+    mejores = mejores[np.argsort(puntaje[mejores], kind="stable")]
+
+    inmuebles = detalle_queryset().in_bulk([int(pk) for pk in filtrados["id"][mejores]])
+    comparables = []
+    precio_m2 = filtrados["precio_usd"] / filtrados["area_construida"]
+    for i in mejores:
+        inmueble = inmuebles.get(int(filtrados["id"][i]))
+        if inmueble is None:  # borrado después de cargar las columnas
+            continue
+        propiedades = inmueble_feature(inmueble)["properties"]
+        propiedades["similitud"] = round(1 / (1 + float(puntaje[i])), 3)
+        propiedades["precio_m2"] = round(float(precio_m2[i]), 2)
+        if not np.isnan(distancia[i]):
+            propiedades["distancia_m"] = round(float(distancia[i]))
+        comparables.append(propiedades)
+    return comparables
@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tools import trabajos
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta la cola de trabajos del ACM (reportes y PDFs) con un pool acotado de hilos. '
+        'Usar con TRABAJOS_EN_PROCESO=0 en los procesos web para concentrar el trabajo acá.'
+    )
+
+    def add_arguments(self, parser):
+        for tipo in trabajos.TAREAS:
+            parser.add_argument(
+                f'--{tipo}', type=int, default=settings.TRABAJOS_CONCURRENCIA.get(tipo, 1),
+                help=f'Hilos para trabajos "{tipo}" (default: TRABAJOS_CONCURRENCIA)',
+            )
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help='Procesa en este hilo lo que haya disponible y termina',
+        )
+
+    def handle(self, *args, **options):
+        if options['una_vez']:
+            trabajos.mantenimiento()
+            procesados = trabajos.procesar_pendientes()
+            self.stdout.write(self.style.SUCCESS(f'{procesados} trabajos procesados.'))
+            return
+
+        concurrencia = {tipo: options[tipo] for tipo in trabajos.TAREAS}
+        if min(concurrencia.values()) < 0 or not any(concurrencia.values()):
+            raise CommandError('La cantidad de hilos por tipo no puede ser negativa ni toda 0.')
+        ejecutor = trabajos.Ejecutor(concurrencia).iniciar()
+        self.stdout.write(
+            'Procesando trabajos con ' + ', '.join(f'{n} hilos {tipo}' for tipo, n in concurrencia.items())
+            + '. Ctrl+C para terminar.'
+        )
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stdout.write('Terminando los trabajos en curso...')
+        finally:
+            ejecutor.detener()
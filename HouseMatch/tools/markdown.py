@@ -0,0 +1,37 @@
+"""
+Markdown → HTML para el reporte del PDF, en el servidor y sin JavaScript.
+
+Usa Python-Markdown con la extensión de tablas. El reporte llega del
+navegador, así que el HTML crudo se escapa en vez de pasar tal cual, y no se
+reconocen imágenes ni enlaces: Chromium no debe pedir URLs elegidas por
+quien genera el PDF (ver ``tools.recursos``).
+"""
+import re
+
+import markdown
+
+# Procesadores de Python-Markdown que se quitan (nombres de su registro).
+_SIN_HTML = ('html_block',)
+_SIN_EN_LINEA = (
+    'html', 'link', 'image_link', 'reference', 'image_reference',
+    'short_reference', 'short_image_ref', 'autolink', 'automail',
+)
+
+
+def _conversor():
+    md = markdown.Markdown(extensions=['tables'], output_format='html')
+    for nombre in _SIN_HTML:
+        md.preprocessors.deregister(nombre)
+    for nombre in _SIN_EN_LINEA:
+        md.inlinePatterns.deregister(nombre)
+    return md
+
+
+def a_html(texto):
+    # Un conversor por llamada: ``Markdown`` guarda estado y no es thread-safe.
+    return _conversor().convert(texto or '')
+
+
+def secciones(texto):
+    """El reporte partido en sus secciones ``## ``, cada una con su título."""
+    return [seccion for seccion in re.split(r'(?m)^(?=## )', texto or '') if seccion.strip()]
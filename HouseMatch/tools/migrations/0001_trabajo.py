@@ -0,0 +1,40 @@
+# Generated by Django 5.2.10 on 2026-10-17 13:05
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajo',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tipo', models.CharField(max_length=20)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('terminado', 'Terminado'), ('fallido', 'Fallido')], default='pendiente', max_length=20)),
+                ('datos', models.JSONField()),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('archivo', models.BinaryField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True)),
+                ('terminado_en', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trabajos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tipo', 'estado', 'disponible_desde'], name='trabajo_cola_idx'), models.Index(fields=['usuario', 'estado'], name='trabajo_usuario_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+import uuid
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class Trabajo(models.Model):
+    """
+    Generación de un reporte ACM o de su PDF, encolada en la base y ejecutada
+    por ``tools.trabajos``. ``datos`` es el cuerpo del pedido; el resultado
+    queda en ``resultado`` (JSON) y, para el PDF, en ``archivo``.
+    """
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    TERMINADO = 'terminado'
+    FALLIDO = 'fallido'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+        (TERMINADO, 'Terminado'),
+        (FALLIDO, 'Fallido'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='trabajos')
+    tipo = models.CharField(max_length=20)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    datos = models.JSONField()
+    resultado = models.JSONField(null=True, blank=True)
+    archivo = models.BinaryField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    disponible_desde = models.DateTimeField(default=timezone.now)  # reintentos con espera
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tipo', 'estado', 'disponible_desde'], name='trabajo_cola_idx'),
+            models.Index(fields=['usuario', 'estado'], name='trabajo_usuario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} {self.pk} ({self.estado})"
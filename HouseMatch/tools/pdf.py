@@ -0,0 +1,159 @@
+"""
+Render de PDFs con Chromium de larga vida.
+
+La API sync de Playwright ata cada navegador al hilo que lo lanzó, así que
+el pool es un conjunto fijo de hilos (``PDF_NAVEGADORES``, el tope de
+Chromium por proceso), cada uno dueño de un navegador con un contexto ya
+abierto. ``renderizar_pdf`` deja el HTML en una cola y espera el resultado:
+un PDF cuesta abrir una página, no arrancar un navegador.
+
+Antes de cada render se verifica que el navegador siga conectado; si se
+cayó (o un render falla y lo deja desconectado) se lanza otro. Cada
+navegador se recicla después de ``PDF_RENDERS_POR_NAVEGADOR`` renders para
+acotar la memoria que Chromium va acumulando; el reemplazo se lanza enseguida,
+fuera del camino de los pedidos.
+
+El HTML llega autocontenido (``tools.recursos`` incrusta imágenes y fuentes,
+el reporte ya viene en HTML): el contexto no corre JavaScript y corta todo
+pedido a la red, así que la página está lista con el evento ``load``.
+"""
+import atexit
+import logging
+import os
+import queue
+import re
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PDF_TIMEOUT = 60  # segundos que un pedido espera su PDF
+PDF_OPCIONES = {
+    'format': 'A4',
+    'print_background': True,
+    'margin': {'top': '15mm', 'bottom': '15mm', 'left': '15mm', 'right': '15mm'},
+}
+_RED = re.compile(r'^https?://')
+
+
+class Chromium:
+    """Un Chromium headless con un contexto abierto; se usa solo desde el hilo que lo creó."""
+
+    def __init__(self):
+        from playwright.sync_api import sync_playwright
+        self._playwright = sync_playwright().start()
+        try:
+            self._browser = self._playwright.chromium.launch()
+            self._contexto = self._browser.new_context(java_script_enabled=False)
+            self._contexto.route(_RED, lambda route: route.abort())
+        except Exception:
+            self._playwright.stop()
+            raise
+        self.renders = 0
+
+    def sano(self):
+        return self._browser.is_connected()
+
+    def pdf(self, html):
+        page = self._contexto.new_page()
+        try:
+            page.set_default_timeout(PDF_TIMEOUT * 1000)
+            page.set_content(html, wait_until='load')
+            return page.pdf(**PDF_OPCIONES)
+        finally:
+            self.renders += 1
+            if self.sano():
+                page.close()
+
+    def cerrar(self):
+        for paso in (self._browser.close, self._playwright.stop):
+            try:
+                paso()
+            except Exception:
+                pass  # ya estaba caído
+
+
+class PoolNavegadores:
+    """``tamanio`` hilos, cada uno con su navegador, que atienden una cola de renders."""
+
+    def __init__(self, tamanio, renders_max, lanzar=Chromium):
+        self.tamanio = tamanio
+        self.renders_max = renders_max
+        self._lanzar = lanzar
+        self._pedidos = queue.Queue()
+        self._hilos = []
+
+    def iniciar(self):
+        for n in range(self.tamanio):
+            hilo = threading.Thread(target=self._bucle, name=f'pdf-{n}', daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        return self
+
+    def renderizar(self, html, timeout=PDF_TIMEOUT):
+        futuro = Future()
+        self._pedidos.put((html, futuro))
+        try:
+            return futuro.result(timeout=timeout)
+        except TimeoutError:
+            futuro.cancel()  # si todavía estaba en la cola, ningún hilo lo toma
+            raise
+
+    def cerrar(self):
+        for _ in self._hilos:
+            self._pedidos.put(None)
+        for hilo in self._hilos:
+            hilo.join(timeout=PDF_TIMEOUT)
+
+    def _abrir(self):
+        try:
+            return self._lanzar()
+        except Exception:
+            logger.exception('No se pudo lanzar el navegador para PDFs')
+            return None
+
+    def _bucle(self):
+        navegador = self._abrir()  # caliente antes del primer pedido
+        try:
+            while (pedido := self._pedidos.get()) is not None:
+                html, futuro = pedido
+                if not futuro.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if navegador is not None and not navegador.sano():
+                        logger.warning('Navegador de PDFs caído, se lanza otro')
+                        navegador.cerrar()
+                        navegador = None
+                    if navegador is None:
+                        navegador = self._lanzar()
+                    futuro.set_result(navegador.pdf(html))
+                except Exception as e:
+                    futuro.set_exception(e)
+                if navegador is not None and (not navegador.sano() or navegador.renders >= self.renders_max):
+                    navegador.cerrar()
+                    navegador = self._abrir()
+        finally:
+            if navegador is not None:
+                navegador.cerrar()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """El pool de este proceso; se crea con el primer PDF (después del fork de gunicorn)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = PoolNavegadores(settings.PDF_NAVEGADORES, settings.PDF_RENDERS_POR_NAVEGADOR).iniciar()
+            _pool_pid = os.getpid()
+            atexit.register(_pool.cerrar)
+    return _pool
+
+
+def renderizar_pdf(html):
+    return pool().renderizar(html)
@@ -0,0 +1,164 @@
+"""
+Recursos externos del PDF del ACM, descargados y cacheados como data URIs.
+
+La plantilla no pide nada a la red: las imágenes de los comparables, el logo
+y la fuente Inter van incrustados en el HTML, así Chromium renderiza apenas
+carga el documento en vez de esperar a que la red quede ociosa. Cada
+descarga se guarda en la cache ``default`` (compartida entre workers en
+producción); una descarga fallida también se recuerda por un rato para que
+un sitio caído no demore cada PDF. Si un recurso no se consigue (o la cache
+no responde) el PDF sale igual, con el marcador "Sin imagen" o la fuente del
+sistema.
+
+Las imágenes salen de la base (``imagenes_principales``), nunca de URLs que
+mande el cliente, y una redirección a otro host se rechaza: el servidor no
+descarga direcciones elegidas por quien pide el PDF.
+"""
+import base64
+import functools
+import hashlib
+import logging
+import re
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+
+from home.models import ImagenInmueble
+
+logger = logging.getLogger(__name__)
+
+RECURSO_KEY = 'pdf_recurso'
+RECURSO_TTL = 60 * 60 * 24  # segundos
+RECURSO_FALLA_TTL = 60 * 5  # segundos que se recuerda una descarga fallida
+RECURSO_TIMEOUT = 5  # segundos por descarga
+RECURSO_TAMANIO_MAX = 5 * 1024 * 1024  # bytes
+RECURSO_DESCARGAS = 6  # descargas en paralelo por PDF
+
+FUENTES_URL = 'https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700;800&display=swap'
+FUENTES_SUBCONJUNTOS = ('latin', 'latin-ext')  # alcanza para el español
+FUENTES_KEY = 'pdf_fuentes'
+FUENTES_TTL = 60 * 60 * 24 * 7  # segundos
+# Google Fonts sirve woff2 solo a navegadores que lo soportan.
+_AGENTE = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+
+_BLOQUE_FUENTE = re.compile(r'/\*\s*([\w-]+)\s*\*/\s*(@font-face\s*\{[^}]*\})')
+_URL_CSS = re.compile(r'url\((https://[^)]+)\)')
+
+
+class _MismoHost(urllib.request.HTTPRedirectHandler):
+    """Sigue redirecciones solo dentro del host pedido (http → https incluido)."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if urlsplit(newurl).hostname != urlsplit(req.full_url).hostname:
+            raise ValueError(f'{req.full_url} redirige a otro host')
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_abridor = urllib.request.build_opener(_MismoHost)
+
+
+def _descargar(url):
+    """(content type, bytes) de ``url``; ValueError si es demasiado grande."""
+    pedido = urllib.request.Request(url, headers={'User-Agent': _AGENTE})
+    with _abridor.open(pedido, timeout=RECURSO_TIMEOUT) as respuesta:
+        contenido = respuesta.read(RECURSO_TAMANIO_MAX + 1)
+        tipo = respuesta.headers.get_content_type()
+    if len(contenido) > RECURSO_TAMANIO_MAX:
+        raise ValueError(f'{url} supera {RECURSO_TAMANIO_MAX} bytes')
+    return tipo, contenido
+
+
+def _clave(url):
+    return f'{RECURSO_KEY}:{hashlib.sha256(url.encode()).hexdigest()}'
+
+
+def _cache_get(clave):
+    try:
+        return cache.get(clave)
+    except Exception:
+        logger.warning('No se pudo leer la cache de recursos del PDF', exc_info=True)
+        return None
+
+
+def _cache_set(clave, valor, ttl):
+    try:
+        cache.set(clave, valor, ttl)
+    except Exception:
+        logger.warning('No se pudo guardar un recurso del PDF en la cache', exc_info=True)
+
+
+def imagenes_principales(ids):
+    """``{id de inmueble: URL de su primera imagen}`` para los ``ids`` válidos."""
+    ids = {i for i in ids if isinstance(i, int) and not isinstance(i, bool)}
+    urls = {}
+    for inmueble_id, url in (
+        ImagenInmueble.objects.filter(inmueble_id__in=ids).order_by('-orden').values_list('inmueble_id', 'url')
+    ):
+        urls[inmueble_id] = url  # la de menor orden queda última
+    return urls
+
+
+def data_uri(url, tipos=('image/',)):
+    """``url`` como data URI, o None si no se pudo descargar o no es de ``tipos``."""
+    if not url or not url.startswith(('http://', 'https://')):
+        return None
+    clave = _clave(url)
+    uri = _cache_get(clave)
+    if uri is None:
+        try:
+            tipo, contenido = _descargar(url)
+            if not tipo.startswith(tipos):
+                raise ValueError(f'{url} es {tipo}')
+        except Exception as e:
+            logger.warning('No se pudo incrustar %s en el PDF: %s', url, e)
+            _cache_set(clave, '', RECURSO_FALLA_TTL)
+            return None
+        uri = f'data:{tipo};base64,{base64.b64encode(contenido).decode()}'
+        _cache_set(clave, uri, RECURSO_TTL)
+    return uri or None
+
+
+def data_uris(urls):
+    """``data_uri`` de cada URL, en el mismo orden; descarga las que faltan en paralelo."""
+    urls = list(urls)
+    if len(urls) <= 1:
+        return [data_uri(url) for url in urls]
+    with ThreadPoolExecutor(max_workers=min(RECURSO_DESCARGAS, len(urls))) as pool:
+        return list(pool.map(data_uri, urls))
+
+
+def fuentes_css():
+    """Los ``@font-face`` de Inter con los archivos incrustados ('' si Google Fonts no responde)."""
+    css = _cache_get(FUENTES_KEY)
+    if css is not None:
+        return css
+    try:
+        _, contenido = _descargar(FUENTES_URL)
+        bloques = [
+            bloque for subconjunto, bloque in _BLOQUE_FUENTE.findall(contenido.decode())
+            if subconjunto in FUENTES_SUBCONJUNTOS
+        ]
+        css = '\n'.join(bloques)
+        for url in set(_URL_CSS.findall(css)):
+            uri = data_uri(url, tipos=('font/', 'application/'))
+            if uri is None:
+                raise ValueError(f'No se pudo descargar {url}')
+            css = css.replace(f'url({url})', f'url({uri})')
+    except Exception as e:
+        logger.warning('PDF sin la fuente Inter: %s', e)
+        _cache_set(FUENTES_KEY, '', RECURSO_FALLA_TTL)
+        return ''
+    _cache_set(FUENTES_KEY, css, FUENTES_TTL)
+    return css
+
+
+@functools.cache
+def logo_data_uri():
+    ruta = finders.find('home/img/Logo.png')
+    if not ruta:
+        return ''
+    with open(ruta, 'rb') as archivo:
+        return f'data:image/png;base64,{base64.b64encode(archivo.read()).decode()}'
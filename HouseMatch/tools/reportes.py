@@ -0,0 +1,108 @@
+"""
+Cache de reportes del ACM direccionada por contenido.
+
+El prompt se arma con una versión canónica del sujeto y los comparables
+(números como ``200000`` en vez de ``"200000.00"``, textos sin espacios
+sobrantes, amenidades como booleanos) y los comparables en orden fijo
+(``ordenar``), así que dos pedidos equivalentes producen el mismo texto. La
+clave es el sha256 de ese prompt sin las estadísticas de zona (que cambian
+con cada ``recalcular``) más el modelo y sus parámetros; el reporte se
+guarda en la cache ``default`` (Redis en producción, compartida entre
+workers) por ``ACM_REPORTE_TTL``. Si la cache no responde, el reporte se
+genera igual.
+"""
+import hashlib
+import json
+import logging
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+ACM_MODELO = 'llama-3.3-70b-versatile'
+ACM_TEMPERATURA = 0.3
+ACM_MAX_TOKENS = 3000
+ACM_REPORTE_KEY = 'acm_reporte'
+ACM_REPORTE_TTL = 60 * 60 * 24 * 7  # segundos; los precios publicados cambian despacio
+
+AMENIDADES = ('parqueo', 'piscina', 'permite_mascotas')
+_NUMERO = re.compile(r'^-?\d+(\.\d+)?$')
+
+
+def _canonico(clave, valor):
+    if clave in AMENIDADES:
+        return bool(valor)  # el prompt solo mira si es verdadero
+    if isinstance(valor, bool) or valor is None:
+        return valor
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if not _NUMERO.match(valor):
+            return valor
+    if isinstance(valor, (int, float, Decimal, str)):
+        try:
+            numero = Decimal(str(valor))
+        except InvalidOperation:  # inf / nan
+            return valor
+        if numero == numero.to_integral_value():
+            return int(numero)
+        return numero.normalize()
+    return valor
+
+
+def canonizar(datos):
+    return {clave: _canonico(clave, valor) for clave, valor in (datos or {}).items()}
+
+
+def ordenar(comparables):
+    """
+    Los comparables en un orden fijo (el de su versión canónica). Es el orden
+    del prompt, así que la vista lo devuelve: "Comparable N" del reporte es el
+    N-ésimo en la pantalla y en el PDF.
+    """
+    return sorted(comparables, key=lambda c: json.dumps(canonizar(c), sort_keys=True, default=str))
+
+
+def normalizar(comparables, sujeto):
+    """Sujeto y comparables canónicos para ``_build_prompt``, en el orden recibido."""
+    return [canonizar(c) for c in comparables], canonizar(sujeto)
+
+
+def clave(prompt):
+    """Clave de cache del reporte; ``prompt`` es el armado sin estadísticas."""
+    contenido = json.dumps(
+        [ACM_MODELO, ACM_TEMPERATURA, ACM_MAX_TOKENS, prompt], ensure_ascii=False
+    ).encode()
+    return f'{ACM_REPORTE_KEY}:{hashlib.sha256(contenido).hexdigest()}'
+
+
+def obtener(clave_reporte):
+    """El reporte cacheado, o None (también si la cache no responde)."""
+    try:
+        return cache.get(clave_reporte)
+    except Exception:
+        logger.warning('No se pudo leer la cache de reportes del ACM', exc_info=True)
+        return None
+
+
+def guardar(clave_reporte, reporte):
+    try:
+        cache.set(clave_reporte, reporte, ACM_REPORTE_TTL)
+    except Exception:
+        logger.warning('No se pudo guardar el reporte del ACM en la cache', exc_info=True)
+
+
+async def aobtener(clave_reporte):
+    try:
+        return await cache.aget(clave_reporte)
+    except Exception:
+        logger.warning('No se pudo leer la cache de reportes del ACM', exc_info=True)
+        return None
+
+
+async def aguardar(clave_reporte, reporte):
+    try:
+        await cache.aset(clave_reporte, reporte, ACM_REPORTE_TTL)
+    except Exception:
+        logger.warning('No se pudo guardar el reporte del ACM en la cache', exc_info=True)
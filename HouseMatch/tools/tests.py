@@ -0,0 +1,742 @@
+import datetime
+import json
+import threading
+import time
+import urllib.request
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from home import catalogo, estadisticas
+from home.models import Departamento, ImagenInmueble, Inmueble, TipoPropiedad, TipoTransaccion
+from home.tests import crear_inmueble
+
+from . import markdown, recursos, trabajos
+from .comparables import buscar_comparables
+from .models import Trabajo
+from .pdf import PoolNavegadores
+from .views import generar_pdf
+
+
+class ComparablesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalogo.invalidar()
+        self.casa = TipoPropiedad.objects.create(nombre="Casa")
+        self.departamento_tipo = TipoPropiedad.objects.create(nombre="Departamento")
+        self.venta = TipoTransaccion.objects.create(nombre="Venta")
+        self.anticretico = TipoTransaccion.objects.create(nombre="Anticrético")
+        self.santa_cruz = Departamento.objects.create(nombre="Santa Cruz")
+        self.sujeto = {
+            "tipo_propiedad": "Casa",
+            "tipo_transaccion": "Venta",
+            "zona": "Equipetrol",
+            "area_construida": "200",
+            "cant_cuartos": "3",
+            "cant_banios": "2",
+        }
+
+    def crear(self, tipo=None, transaccion=None, **kwargs):
+        # Por defecto, una casa de la zona del sujeto con sus mismas características.
+        datos = {
+            "area_construida": "200.00",
+            "area_terreno": "300.00",
+            "precio_usd": "200000.00",
+            "precio_bs": "1392000.00",
+            "zona": "Equipetrol",
+            "latitud": "-17.770000",
+            "longitud": "-63.190000",
+            **kwargs,
+        }
+        return crear_inmueble(tipo or self.casa, transaccion or self.venta, self.santa_cruz, **datos)
+
+
+class BuscarComparablesTests(ComparablesTestCase):
+    def test_ranks_by_similarity_within_type_and_transaction(self):
+        igual = self.crear()
+        grande = self.crear(area_construida="400.00", precio_usd="400000.00")
+        otra_zona = self.crear(zona="Norte", cant_cuartos=4)
+        self.crear(tipo=self.departamento_tipo)
+        self.crear(transaccion=self.anticretico)
+        self.crear(activo=False)
+
+        comparables = buscar_comparables(self.sujeto, k=5)
+
+        self.assertEqual([c["id"] for c in comparables], [igual.id, otra_zona.id, grande.id])
+        self.assertEqual(comparables[0]["similitud"], 1.0)
+        self.assertEqual(comparables[0]["precio_m2"], 1000.0)
+        self.assertEqual(comparables[0]["titulo"], "Casa de prueba")
+
+    def test_price_outliers_rank_below_typical_listings(self):
+        tipico = self.crear(zona="Norte")
+        self.crear(zona="Norte", precio_usd="20000.00")
+        self.crear(zona="Norte", precio_usd="210000.00")
+
+        self.assertEqual(buscar_comparables(self.sujeto, k=1)[0]["id"], tipico.id)
+
+    def test_location_adds_distance_and_radius_limit(self):
+        cerca = self.crear(latitud="-17.775000")
+        self.crear(latitud="-17.950000")
+
+        comparables = buscar_comparables(
+            {**self.sujeto, "latitud": -17.77, "longitud": -63.19}, k=5, radio_max=5000
+        )
+
+        self.assertEqual([c["id"] for c in comparables], [cerca.id])
+        self.assertEqual(comparables[0]["distancia_m"], 556)
+
+    def test_transaction_names_ignore_accents_and_case(self):
+        anticretico = self.crear(transaccion=self.anticretico)
+
+        comparables = buscar_comparables({**self.sujeto, "tipo_transaccion": "anticretico"})
+
+        self.assertEqual([c["id"] for c in comparables], [anticretico.id])
+
+    def test_new_listings_are_seen_after_map_changes(self):
+        self.crear(zona="Norte")
+        self.assertEqual(len(buscar_comparables(self.sujeto, k=5)), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear()
+
+        self.assertEqual(len(buscar_comparables(self.sujeto, k=5)), 2)
+
+
+class AcmComparablesViewTests(ComparablesTestCase):
+    def setUp(self):
+        super().setUp()
+        usuario = get_user_model().objects.create_user(
+            email="asesor@example.com",
+            username="asesor",
+            password="test1234",
+            fecha_vencimiento_plan=datetime.date.today() + datetime.timedelta(days=30),
+        )
+        self.client.force_login(usuario)
+        with self.captureOnCommitCallbacks(execute=True):  # estadísticas de zona
+            self.inmuebles = [self.crear(), self.crear(zona="Norte"), self.crear(area_construida="250.00")]
+
+    def post(self, url, body):
+        return self.client.post(url, json.dumps(body), content_type="application/json")
+
+    def test_comparables_endpoint_returns_top_k(self):
+        response = self.post("/tools/acm/api/comparables/", {"sujeto": self.sujeto, "k": 2})
+
+        self.assertEqual(response.status_code, 200)
+        ids = [c["id"] for c in response.json()["comparables"]]
+        self.assertEqual(ids, [self.inmuebles[0].id, self.inmuebles[2].id])
+
+    def test_comparables_endpoint_validates_k(self):
+        response = self.post("/tools/acm/api/comparables/", {"sujeto": self.sujeto, "k": 50})
+
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch("tools.views.Groq")
+    def test_generar_without_comparables_uses_engine(self, groq):
+        completion = groq.return_value.chat.completions.create.return_value
+        completion.choices = [mock.Mock(message=mock.Mock(content="## Reporte"))]
+
+        response = self.post("/tools/acm/api/generar/", {"sujeto": self.sujeto})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["reporte"], "## Reporte")
+        self.assertEqual(len(data["comparables"]), 3)
+        prompt = groq.return_value.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+        self.assertIn("Comparable 3:", prompt)
+
+    @mock.patch("tools.views.Groq")
+    def test_generar_prompt_includes_zone_statistics(self, groq):
+        completion = groq.return_value.chat.completions.create.return_value
+        completion.choices = [mock.Mock(message=mock.Mock(content="## Reporte"))]
+
+        self.post("/tools/acm/api/generar/", {"sujeto": self.sujeto})
+
+        prompt = groq.return_value.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+        self.assertIn("ESTADÍSTICAS DEL MERCADO", prompt)
+        # La zona del sujeto va primero: 2 casas en venta de 1000 y 800 USD/m².
+        self.assertIn("- Equipetrol, Santa Cruz (Casa, Venta): 2 publicaciones | mediana $900 USD/m²", prompt)
+        self.assertIn("- Norte, Santa Cruz (Casa, Venta): 1 publicaciones", prompt)
+
+
+class AcmReporteCacheTests(ComparablesTestCase):
+    def setUp(self):
+        super().setUp()
+        usuario = get_user_model().objects.create_user(
+            email="asesor@example.com",
+            username="asesor",
+            password="test1234",
+            fecha_vencimiento_plan=datetime.date.today() + datetime.timedelta(days=30),
+        )
+        self.client.force_login(usuario)
+        self.comparables = [
+            {"id": 1, "titulo": "Casa A", "zona": "Norte", "precio_usd": "150000.00", "area_construida": "180.00"},
+            {"id": 2, "titulo": "Casa B", "zona": "Norte", "precio_usd": "210000.00", "area_construida": "240.00"},
+        ]
+
+    def generar(self, comparables, sujeto):
+        body = {"comparables": comparables, "sujeto": sujeto}
+        response = self.client.post("/tools/acm/api/generar/", json.dumps(body), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @mock.patch("tools.views.Groq")
+    def test_equivalent_requests_reuse_report(self, groq):
+        completion = groq.return_value.chat.completions.create.return_value
+        completion.choices = [mock.Mock(message=mock.Mock(content="## Reporte"))]
+        equivalentes = [
+            {**self.comparables[1], "precio_usd": 210000, "titulo": " Casa B "},
+            {**self.comparables[0], "similitud": 0.9},
+        ]
+
+        primero = self.generar(self.comparables, self.sujeto)
+        segundo = self.generar(equivalentes, {**self.sujeto, "area_construida": "200.00", "piscina": 0})
+
+        self.assertFalse(primero["en_cache"])
+        self.assertTrue(segundo["en_cache"])
+        self.assertEqual(segundo["reporte"], "## Reporte")
+        self.assertEqual(segundo["comparables"], [equivalentes[1], equivalentes[0]])
+        self.assertEqual(groq.return_value.chat.completions.create.call_count, 1)
+
+    @mock.patch("tools.views.Groq")
+    def test_comparables_come_back_in_prompt_order(self, groq):
+        completion = groq.return_value.chat.completions.create.return_value
+        completion.choices = [mock.Mock(message=mock.Mock(content="## Reporte"))]
+        comparables = [{**self.comparables[0], "titulo": "Zeta casa"}, {**self.comparables[1], "titulo": "Alfa depto"}]
+
+        for pedido in (comparables, comparables[::-1]):
+            respuesta = self.generar(pedido, self.sujeto)
+            prompt = groq.return_value.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+            titulos = [c["titulo"] for c in respuesta["comparables"]]
+            for n, titulo in enumerate(titulos, 1):
+                self.assertIn(f"Comparable {n}:\n- Título: {titulo}", prompt)
+        self.assertEqual(groq.return_value.chat.completions.create.call_count, 1)
+
+    @mock.patch("tools.views.Groq")
+    def test_recomputed_statistics_keep_the_cached_report(self, groq):
+        completion = groq.return_value.chat.completions.create.return_value
+        completion.choices = [mock.Mock(message=mock.Mock(content="## Reporte"))]
+        self.crear()
+        estadisticas.recalcular()
+
+        self.generar(self.comparables, self.sujeto)
+        prompt = groq.return_value.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+        self.assertIn("ESTADÍSTICAS DEL MERCADO", prompt)
+        self.crear(precio_usd="260000.00")
+        estadisticas.recalcular()
+        segundo = self.generar(self.comparables, self.sujeto)
+
+        self.assertTrue(segundo["en_cache"])
+        self.assertEqual(groq.return_value.chat.completions.create.call_count, 1)
+
+    @mock.patch("tools.reportes.cache")
+    @mock.patch("tools.views.Groq")
+    def test_cache_outage_still_generates_report(self, groq, cache_reportes):
+        completion = groq.return_value.chat.completions.create.return_value
+        completion.choices = [mock.Mock(message=mock.Mock(content="## Reporte"))]
+        cache_reportes.get.side_effect = cache_reportes.set.side_effect = ConnectionError("redis caído")
+
+        respuesta = self.generar(self.comparables, self.sujeto)
+
+        self.assertEqual(respuesta["reporte"], "## Reporte")
+        self.assertFalse(respuesta["en_cache"])
+
+    @mock.patch("tools.views.Groq")
+    def test_different_subject_calls_model_again(self, groq):
+        completion = groq.return_value.chat.completions.create.return_value
+        completion.choices = [mock.Mock(message=mock.Mock(content="## Reporte"))]
+
+        self.generar(self.comparables, self.sujeto)
+        otro = self.generar(self.comparables, {**self.sujeto, "area_construida": "210"})
+
+        self.assertFalse(otro["en_cache"])
+        self.assertEqual(groq.return_value.chat.completions.create.call_count, 2)
+
+
+def fragmentos(*textos):
+    async def stream():
+        for texto in textos:
+            yield mock.Mock(choices=[mock.Mock(delta=mock.Mock(content=texto))])
+
+    # El SDK devuelve un AsyncStream: iterable async y context manager.
+    respuesta = mock.MagicMock()
+    respuesta.__aiter__ = lambda _: stream()
+    return respuesta
+
+
+def eventos_sse(cuerpo):
+    eventos = []
+    for bloque in cuerpo.decode().strip().split("\n\n"):
+        lineas = dict(linea.split(": ", 1) for linea in bloque.split("\n"))
+        eventos.append((lineas["event"], json.loads(lineas["data"])))
+    return eventos
+
+
+class AcmGenerarStreamTests(ComparablesTestCase):
+    url = "/tools/acm/api/generar/stream/"
+
+    def setUp(self):
+        super().setUp()
+        self.usuario = get_user_model().objects.create_user(
+            email="asesor@example.com",
+            username="asesor",
+            password="test1234",
+            fecha_vencimiento_plan=datetime.date.today() + datetime.timedelta(days=30),
+        )
+        self.inmuebles = [self.crear(), self.crear(zona="Norte")]
+
+    async def post(self, body):
+        await self.async_client.aforce_login(self.usuario)
+        response = await self.async_client.post(self.url, json.dumps(body), content_type="application/json")
+        if response.streaming:
+            response.cuerpo = b"".join([parte async for parte in response.streaming_content])
+        return response
+
+    @mock.patch("tools.views.AsyncGroq")
+    async def test_streams_tokens_and_caches_the_full_report(self, groq):
+        groq.return_value.chat.completions.create = mock.AsyncMock(return_value=fragmentos("## 1. Res", "umen\n"))
+
+        response = await self.post({"sujeto": self.sujeto})
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        eventos = eventos_sse(response.cuerpo)
+        self.assertEqual([e for e, _ in eventos], ["inicio", "texto", "texto", "fin"])
+        self.assertFalse(eventos[0][1]["en_cache"])
+        self.assertEqual(len(eventos[0][1]["comparables"]), 2)
+        self.assertEqual("".join(d["texto"] for e, d in eventos if e == "texto"), "## 1. Resumen\n")
+        self.assertTrue(groq.return_value.chat.completions.create.call_args.kwargs["stream"])
+
+        eventos = eventos_sse((await self.post({"sujeto": self.sujeto})).cuerpo)
+
+        self.assertTrue(eventos[0][1]["en_cache"])
+        self.assertEqual(eventos[1], ("texto", {"texto": "## 1. Resumen\n"}))
+        self.assertEqual(groq.return_value.chat.completions.create.call_count, 1)
+
+    @mock.patch("tools.views.AsyncGroq")
+    async def test_model_failure_is_an_error_event(self, groq):
+        groq.return_value.chat.completions.create = mock.AsyncMock(side_effect=RuntimeError("sin cuota"))
+
+        eventos = eventos_sse((await self.post({"sujeto": self.sujeto})).cuerpo)
+
+        self.assertEqual(eventos[-1], ("error", {"error": "sin cuota"}))
+
+    @mock.patch("tools.reportes.cache")
+    @mock.patch("tools.views.AsyncGroq")
+    async def test_cache_outage_still_ends_the_stream(self, groq, cache_reportes):
+        groq.return_value.chat.completions.create = mock.AsyncMock(return_value=fragmentos("## Reporte"))
+        cache_reportes.aget = mock.AsyncMock(side_effect=ConnectionError("redis caído"))
+        cache_reportes.aset = mock.AsyncMock(side_effect=ConnectionError("redis caído"))
+
+        eventos = eventos_sse((await self.post({"sujeto": self.sujeto})).cuerpo)
+
+        self.assertEqual([e for e, _ in eventos], ["inicio", "texto", "fin"])
+        cache_reportes.aset.assert_awaited_once()
+
+    async def test_invalid_request_is_plain_json(self):
+        response = await self.post({"sujeto": self.sujeto, "comparables": [{"id": 1}]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()["ok"])
+
+    async def test_requires_active_plan(self):
+        response = await self.async_client.post(self.url, "{}", content_type="application/json")
+
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(TRABAJOS_EN_PROCESO=False)
+class AcmTrabajosTests(ComparablesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.usuario = get_user_model().objects.create_user(
+            email="asesor@example.com",
+            username="asesor",
+            password="test1234",
+            fecha_vencimiento_plan=datetime.date.today() + datetime.timedelta(days=30),
+        )
+        self.client.force_login(self.usuario)
+        self.crear()
+        self.crear(zona="Norte")
+
+    def encolar(self, **body):
+        body.setdefault("sujeto", self.sujeto)
+        return self.client.post("/tools/acm/api/trabajos/", json.dumps(body), content_type="application/json")
+
+    def estado(self, trabajo_id):
+        return self.client.get(f"/tools/acm/api/trabajos/{trabajo_id}/").json()
+
+    @mock.patch("tools.views.Groq")
+    def test_acm_job_runs_in_the_queue(self, groq):
+        completion = groq.return_value.chat.completions.create.return_value
+        completion.choices = [mock.Mock(message=mock.Mock(content="## Reporte"))]
+
+        response = self.encolar(tipo="acm")
+
+        self.assertEqual(response.status_code, 202)
+        trabajo_id = response.json()["id"]
+        self.assertEqual(self.estado(trabajo_id)["estado"], "pendiente")
+        self.assertEqual(trabajos.procesar_pendientes(), 1)
+        datos = self.estado(trabajo_id)
+        self.assertEqual(datos["estado"], "terminado")
+        self.assertEqual(datos["resultado"]["reporte"], "## Reporte")
+        self.assertEqual(len(datos["resultado"]["comparables"]), 2)
+
+    @mock.patch("tools.trabajos.ejecutor")
+    def test_polling_a_pending_job_starts_the_executor(self, ejecutor):
+        trabajo_id = self.encolar().json()["id"]
+
+        with override_settings(TRABAJOS_EN_PROCESO=True):
+            self.estado(trabajo_id)
+
+        ejecutor.return_value.despertar.assert_called_once_with("acm")
+
+    def test_body_must_be_a_json_object(self):
+        for cuerpo in ("[]", '"x"', "1"):
+            response = self.client.post("/tools/acm/api/trabajos/", cuerpo, content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Trabajo.objects.exists())
+
+    @mock.patch("tools.views.Groq")
+    def test_transient_errors_are_retried_with_backoff(self, groq):
+        completion = mock.Mock(choices=[mock.Mock(message=mock.Mock(content="## Reporte"))])
+        groq.return_value.chat.completions.create.side_effect = [TimeoutError("Request timed out."), completion]
+        trabajo_id = self.encolar().json()["id"]
+
+        trabajos.procesar_pendientes()
+
+        trabajo = Trabajo.objects.get(pk=trabajo_id)
+        self.assertEqual((trabajo.estado, trabajo.intentos), ("pendiente", 1))
+        self.assertGreater(trabajo.disponible_desde, timezone.now())
+        self.assertEqual(self.estado(trabajo_id)["error"], "Request timed out.")
+        self.assertEqual(trabajos.procesar_pendientes(), 0)  # todavía en espera
+
+        Trabajo.objects.filter(pk=trabajo_id).update(disponible_desde=timezone.now())
+        trabajos.procesar_pendientes()
+
+        datos = self.estado(trabajo_id)
+        self.assertEqual((datos["estado"], datos["intentos"]), ("terminado", 2))
+
+    @override_settings(TRABAJOS_INTENTOS=1)
+    @mock.patch("tools.views.Groq")
+    def test_job_fails_after_last_attempt(self, groq):
+        groq.return_value.chat.completions.create.side_effect = TimeoutError("Request timed out.")
+        trabajo_id = self.encolar().json()["id"]
+
+        trabajos.procesar_pendientes()
+
+        datos = self.estado(trabajo_id)
+        self.assertEqual(datos["estado"], "fallido")
+        self.assertFalse(datos["ok"])
+
+    def test_invalid_request_fails_without_retry(self):
+        trabajo_id = self.encolar(comparables=[{"id": 1}]).json()["id"]
+
+        trabajos.procesar_pendientes()
+
+        datos = self.estado(trabajo_id)
+        self.assertEqual((datos["estado"], datos["intentos"]), ("fallido", 1))
+        self.assertEqual(datos["error"], "Se requieren 2 o 3 inmuebles comparables")
+
+    @mock.patch("tools.views.generar_pdf", return_value=b"%PDF-1.4 prueba")
+    def test_pdf_job_is_downloaded_once_finished(self, generar_pdf):
+        trabajo_id = self.encolar(tipo="pdf", reporte="## Reporte").json()["id"]
+        url = f"/tools/acm/api/trabajos/{trabajo_id}/pdf/"
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        trabajos.procesar_pendientes()
+
+        self.assertEqual(self.estado(trabajo_id)["descarga"], url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"%PDF-1.4 prueba")
+        self.assertEqual(generar_pdf.call_args.args, ({"sujeto": self.sujeto, "reporte": "## Reporte"}, self.usuario))
+
+    @override_settings(TRABAJOS_POR_USUARIO=2)
+    def test_limits_active_jobs_per_user(self):
+        self.encolar()
+        self.encolar()
+
+        self.assertEqual(self.encolar().status_code, 429)
+        self.assertEqual(self.encolar(tipo="mapa").status_code, 400)
+
+    def test_jobs_of_other_users_are_not_visible(self):
+        otro = get_user_model().objects.create_user(email="otro@example.com", username="otro", password="x")
+        trabajo = trabajos.encolar("acm", otro, {})
+
+        response = self.client.get(f"/tools/acm/api/trabajos/{trabajo.pk}/")
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_stuck_jobs_go_back_to_the_queue(self):
+        trabajo = trabajos.encolar("acm", self.usuario, {"sujeto": self.sujeto})
+        self.assertEqual(trabajos.reclamar("acm").pk, trabajo.pk)
+        self.assertIsNone(trabajos.reclamar("acm"))
+        hace_rato = timezone.now() - datetime.timedelta(seconds=trabajos.TRABAJOS_TIMEOUT + 1)
+        Trabajo.objects.filter(pk=trabajo.pk).update(iniciado_en=hace_rato)
+
+        trabajos.mantenimiento()
+
+        self.assertEqual(Trabajo.objects.get(pk=trabajo.pk).estado, "pendiente")
+
+    @mock.patch("tools.views.generar_reporte", return_value={"reporte": "viejo"})
+    def test_stale_run_does_not_overwrite_the_new_claim(self, generar_reporte):
+        trabajo = trabajos.encolar("acm", self.usuario, {"sujeto": self.sujeto})
+        viejo = trabajos.reclamar("acm")
+        hace_rato = timezone.now() - datetime.timedelta(seconds=trabajos.TRABAJOS_TIMEOUT + 1)
+        Trabajo.objects.filter(pk=trabajo.pk).update(iniciado_en=hace_rato)
+        trabajos.mantenimiento()
+        nuevo = trabajos.reclamar("acm")
+
+        trabajos.ejecutar(viejo)  # el intento colgado termina tarde
+
+        self.assertEqual(Trabajo.objects.get(pk=trabajo.pk).estado, "en_curso")
+        generar_reporte.return_value = {"reporte": "nuevo"}
+        trabajos.ejecutar(nuevo)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.resultado, trabajo.intentos), ("terminado", {"reporte": "nuevo"}, 2))
+
+    async def test_long_polling_waits_for_the_result(self):
+        trabajo = await Trabajo.objects.acreate(tipo="acm", usuario=self.usuario, datos={})
+        await self.async_client.aforce_login(self.usuario)
+
+        response = await self.async_client.get(f"/tools/acm/api/trabajos/{trabajo.pk}/", {"esperar": "0.3"})
+
+        self.assertEqual(response.json()["estado"], "pendiente")
+
+
+@override_settings(TRABAJOS_EN_PROCESO=False)
+class EjecutorTrabajosTests(TransactionTestCase):
+    @mock.patch("tools.trabajos.TRABAJOS_ESPERA_OCIOSA", 0.05)
+    @mock.patch("tools.views.generar_reporte")
+    def test_pool_runs_jobs_concurrently_up_to_the_limit(self, generar_reporte):
+        usuario = get_user_model().objects.create_user(email="a@example.com", username="a", password="x")
+        en_curso, maximo, lock = [0], [0], threading.Lock()
+
+        def generar(body):
+            with lock:
+                en_curso[0] += 1
+                maximo[0] = max(maximo[0], en_curso[0])
+            time.sleep(0.1)
+            with lock:
+                en_curso[0] -= 1
+            return {"reporte": body["n"]}
+
+        generar_reporte.side_effect = generar
+        pks = [trabajos.encolar("acm", usuario, {"n": n}).pk for n in range(5)]
+
+        ejecutor = trabajos.Ejecutor({"acm": 2}).iniciar()
+        try:
+            limite = time.monotonic() + 10
+            while Trabajo.objects.exclude(estado=Trabajo.TERMINADO).exists() and time.monotonic() < limite:
+                time.sleep(0.05)
+        finally:
+            ejecutor.detener()
+
+        self.assertEqual([Trabajo.objects.get(pk=pk).resultado["reporte"] for pk in pks], [0, 1, 2, 3, 4])
+        self.assertEqual(maximo[0], 2)
+
+
+class NavegadorFalso:
+    lanzados = []
+
+    def __init__(self, falla=False):
+        self.renders = 0
+        self.conectado = True
+        self.cerrado = False
+        self.hilo = threading.current_thread()
+        self.falla = falla
+        NavegadorFalso.lanzados.append(self)
+
+    def sano(self):
+        return self.conectado
+
+    def pdf(self, html):
+        assert threading.current_thread() is self.hilo  # Playwright sync no cruza hilos
+        self.renders += 1
+        if self.falla:
+            self.conectado = False
+            raise RuntimeError("Target page, context or browser has been closed")
+        return f"PDF {html}".encode()
+
+    def cerrar(self):
+        self.cerrado = True
+
+
+class PoolNavegadoresTests(SimpleTestCase):
+    def setUp(self):
+        NavegadorFalso.lanzados = []
+
+    def pool(self, tamanio=1, renders_max=100, lanzar=NavegadorFalso):
+        pool = PoolNavegadores(tamanio, renders_max, lanzar=lanzar).iniciar()
+        self.addCleanup(pool.cerrar)
+        return pool
+
+    def test_renders_reuse_the_warm_browser(self):
+        pool = self.pool()
+
+        self.assertEqual([pool.renderizar(f"<p>{n}</p>") for n in range(3)],
+                         [b"PDF <p>0</p>", b"PDF <p>1</p>", b"PDF <p>2</p>"])
+        self.assertEqual(len(NavegadorFalso.lanzados), 1)
+        self.assertEqual(NavegadorFalso.lanzados[0].renders, 3)
+
+    def test_browser_is_recycled_after_max_renders(self):
+        pool = self.pool(renders_max=2)
+
+        for n in range(3):
+            pool.renderizar("<p></p>")
+
+        primero, segundo = NavegadorFalso.lanzados
+        self.assertTrue(primero.cerrado)
+        self.assertEqual((primero.renders, segundo.renders), (2, 1))
+
+    def test_crashed_browser_is_replaced(self):
+        fallas = iter([True, False])
+        pool = self.pool(lanzar=lambda: NavegadorFalso(falla=next(fallas)))
+
+        with self.assertRaises(RuntimeError):
+            pool.renderizar("<p></p>")
+        self.assertEqual(pool.renderizar("<p>ok</p>"), b"PDF <p>ok</p>")
+
+        self.assertTrue(NavegadorFalso.lanzados[0].cerrado)
+        self.assertEqual(len(NavegadorFalso.lanzados), 2)
+
+    def test_pool_caps_browsers(self):
+        pool = self.pool(tamanio=2)
+        hilos = [threading.Thread(target=pool.renderizar, args=("<p></p>",)) for _ in range(6)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(NavegadorFalso.lanzados), 2)
+        self.assertEqual(sum(n.renders for n in NavegadorFalso.lanzados), 6)
+
+
+class MarkdownTests(SimpleTestCase):
+    def test_renders_report_blocks(self):
+        html = markdown.a_html(
+            "## 1. Resumen\nEl precio es **USD 180.000** *aprox.*\n\n"
+            "| Concepto | Sujeto |\n|---|---|\n| Área | 200 m² |\n\n"
+            "- uno\n- dos\n\nTexto\n\n1. primero\n\n> cita"
+        )
+
+        for bloque in (
+            "<h2>1. Resumen</h2>",
+            "<p>El precio es <strong>USD 180.000</strong> <em>aprox.</em></p>",
+            "<table><thead><tr><th>Concepto</th><th>Sujeto</th></tr></thead>"
+            "<tbody><tr><td>Área</td><td>200 m²</td></tr></tbody></table>",
+            "<ul><li>uno</li><li>dos</li></ul>",
+            "<ol><li>primero</li></ol>",
+            "<blockquote><p>cita</p></blockquote>",
+        ):
+            self.assertInHTML(bloque, html)
+
+    def test_html_in_the_report_is_escaped(self):
+        html = markdown.a_html('<script>alert(1)</script> <img src="x">')
+
+        self.assertNotIn("<script", html)
+        self.assertNotIn("<img", html)
+
+    def test_links_and_images_are_not_rendered(self):
+        html = markdown.a_html("![x](http://10.0.0.1/a.png) [y](javascript:alert(1)) <http://example.com>")
+
+        self.assertNotIn("<img", html)
+        self.assertNotIn("<a", html)
+
+    def test_report_is_split_by_section(self):
+        self.assertEqual(markdown.secciones("## Uno\ntexto\n## Dos\n### Sub\n"),
+                         ["## Uno\ntexto\n", "## Dos\n### Sub\n"])
+
+
+class RecursosPdfTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch("tools.recursos._descargar", return_value=("image/png", b"png"))
+    def test_image_is_inlined_and_cached(self, descargar):
+        uris = recursos.data_uris(["https://img.example.com/a.png", "https://img.example.com/a.png"])
+
+        self.assertEqual(uris, ["data:image/png;base64,cG5n"] * 2)
+        self.assertEqual(recursos.data_uri("https://img.example.com/a.png"), "data:image/png;base64,cG5n")
+        self.assertLessEqual(descargar.call_count, 2)  # las dos primeras pueden correr a la vez
+        descargar.reset_mock()
+        recursos.data_uri("https://img.example.com/a.png")
+        descargar.assert_not_called()
+
+    @mock.patch("tools.recursos._descargar", side_effect=OSError("timeout"))
+    def test_failed_download_is_remembered(self, descargar):
+        self.assertIsNone(recursos.data_uri("https://img.example.com/caida.png"))
+        self.assertIsNone(recursos.data_uri("https://img.example.com/caida.png"))
+        self.assertIsNone(recursos.data_uri("/media/local.png"))
+        self.assertEqual(descargar.call_count, 1)
+
+    @mock.patch("tools.recursos.cache")
+    @mock.patch("tools.recursos._descargar", return_value=("image/png", b"png"))
+    def test_cache_outage_still_inlines(self, descargar, cache_recursos):
+        cache_recursos.get.side_effect = cache_recursos.set.side_effect = ConnectionError("redis caído")
+
+        self.assertEqual(recursos.data_uri("https://img.example.com/a.png"), "data:image/png;base64,cG5n")
+
+    def test_redirect_to_another_host_is_refused(self):
+        redireccion = recursos._MismoHost()
+        pedido = urllib.request.Request("http://img.example.com/a.png")
+
+        with self.assertRaises(ValueError):
+            redireccion.redirect_request(pedido, None, 302, "Found", {}, "http://169.254.169.254/")
+        mismo = redireccion.redirect_request(pedido, None, 302, "Found", {}, "https://img.example.com/b.png")
+        self.assertEqual(mismo.full_url, "https://img.example.com/b.png")
+
+    @mock.patch("tools.recursos._descargar")
+    def test_fonts_keep_latin_subsets_inlined(self, descargar):
+        css = (
+            "/* cyrillic */\n@font-face { font-family: 'Inter'; src: url(https://fonts.example.com/cy.woff2); }\n"
+            "/* latin */\n@font-face { font-family: 'Inter'; src: url(https://fonts.example.com/la.woff2); }\n"
+        )
+        descargar.side_effect = lambda url: (
+            ("text/css", css.encode()) if url == recursos.FUENTES_URL else ("font/woff2", b"woff2")
+        )
+
+        fuentes = recursos.fuentes_css()
+
+        self.assertEqual(fuentes, "@font-face { font-family: 'Inter'; src: url(data:font/woff2;base64,d29mZjI=); }")
+        self.assertEqual(recursos.fuentes_css(), fuentes)
+        self.assertEqual(descargar.call_count, 2)
+
+
+class GenerarPdfTests(ComparablesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.usuario = get_user_model().objects.create_user(
+            email="asesor@example.com", username="asesor", password="test1234"
+        )
+        self.con_imagen, self.sin_imagen = self.crear(titulo="Casa 1"), self.crear(titulo="Casa 2")
+        ImagenInmueble.objects.create(inmueble=self.con_imagen, url="https://img.example.com/2.jpg", orden=1)
+        ImagenInmueble.objects.create(inmueble=self.con_imagen, url="https://img.example.com/1.jpg", orden=0)
+
+    @mock.patch("tools.recursos.fuentes_css", return_value="@font-face { font-family: 'Inter'; }")
+    @mock.patch("tools.recursos._descargar", return_value=("image/jpeg", b"jpg"))
+    @mock.patch("tools.views.renderizar_pdf", return_value=b"%PDF-1.4 prueba")
+    def test_html_is_self_contained(self, renderizar_pdf, descargar, fuentes_css):
+        body = {
+            "sujeto": {"zona": "Equipetrol"},
+            "comparables": [
+                # La URL del cliente se ignora: la imagen sale de la base.
+                {"id": self.con_imagen.pk, "titulo": "Casa 1", "imagen_principal": "http://169.254.169.254/"},
+                {"id": self.sin_imagen.pk, "titulo": "Casa 2", "imagen_principal": "http://localhost/admin"},
+            ],
+            "reporte": "## 1. Resumen\nValor **estimado**.\n## 2. Conclusión\nListo.",
+        }
+
+        self.assertEqual(generar_pdf(body, self.usuario), b"%PDF-1.4 prueba")
+
+        descargar.assert_called_once_with("https://img.example.com/1.jpg")
+        html = renderizar_pdf.call_args.args[0]
+        self.assertNotIn("<script", html)
+        self.assertNotRegex(html, r'(src|href)="https?://')
+        self.assertIn('src="data:image/jpeg;base64,anBn"', html)
+        self.assertIn("Sin imagen", html)
+        self.assertEqual(html.count('class="report-section-box"'), 2)
+        self.assertIn("<p>Valor <strong>estimado</strong>.</p>", html)
+        self.assertIn("@font-face { font-family: 'Inter'; }", html)
@@ -0,0 +1,199 @@
+"""
+Cola de trabajos del ACM (reportes y PDFs) sin broker externo.
+
+``encolar`` guarda un ``Trabajo`` pendiente en la base. Los ejecutores lo
+toman con un UPDATE condicional (``pendiente`` → ``en_curso``), que en SQLite
+y en PostgreSQL deja que un solo hilo se quede con cada trabajo aunque haya
+varios procesos mirando la misma tabla. Cada tipo tiene su límite de hilos
+(``TRABAJOS_CONCURRENCIA``): eso acota cuántas llamadas al LLM o cuántos
+Chromium corren a la vez por proceso; el resto espera en la cola.
+
+Un ``ValueError`` (pedido inválido) falla el trabajo en el acto; cualquier
+otro error se reintenta hasta ``TRABAJOS_INTENTOS`` veces con espera
+exponencial. Un trabajo ``en_curso`` por más de ``TRABAJOS_TIMEOUT`` (su
+proceso murió) vuelve a la cola.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Trabajo
+
+logger = logging.getLogger(__name__)
+
+TAREAS = {
+    'acm': 'tools.views.tarea_acm',
+    'pdf': 'tools.views.tarea_pdf',
+}
+TRABAJOS_TIMEOUT = 5 * 60  # segundos que puede durar un intento
+TRABAJOS_REINTENTO_BASE = 5  # segundos de espera antes del 2.º intento; se duplica
+TRABAJOS_ESPERA_OCIOSA = 1.0  # segundos entre consultas con la cola vacía
+TRABAJOS_RETENCION = timedelta(days=7)  # los terminados o fallidos se borran después
+TRABAJOS_RECLAMAR_CANDIDATOS = 10
+
+
+def encolar(tipo, usuario, datos):
+    if tipo not in TAREAS:
+        raise ValueError(f'Tipo de trabajo desconocido: {tipo}')
+    trabajo = Trabajo.objects.create(tipo=tipo, usuario=usuario, datos=datos)
+    if settings.TRABAJOS_EN_PROCESO:
+        transaction.on_commit(lambda: ejecutor().despertar(tipo))
+    return trabajo
+
+
+def activos(usuario):
+    """Trabajos del usuario que todavía no terminaron."""
+    return Trabajo.objects.filter(usuario=usuario, estado__in=[Trabajo.PENDIENTE, Trabajo.EN_CURSO])
+
+
+def reclamar(tipo):
+    """Toma el trabajo disponible más antiguo de ``tipo`` (o None)."""
+    ahora = timezone.now()
+    candidatos = list(
+        Trabajo.objects.filter(tipo=tipo, estado=Trabajo.PENDIENTE, disponible_desde__lte=ahora)
+        .order_by('disponible_desde')
+        .values_list('pk', flat=True)[:TRABAJOS_RECLAMAR_CANDIDATOS]
+    )
+    for pk in candidatos:
+        tomado = Trabajo.objects.filter(pk=pk, estado=Trabajo.PENDIENTE).update(
+            estado=Trabajo.EN_CURSO, iniciado_en=ahora, intentos=F('intentos') + 1
+        )
+        if tomado:  # si no, otro hilo o proceso lo tomó antes
+            return Trabajo.objects.select_related('usuario').get(pk=pk)
+    return None
+
+
+def ejecutar(trabajo):
+    """Corre la tarea de ``trabajo`` (ya reclamado) y guarda el resultado o el error."""
+    try:
+        resultado, archivo = import_string(TAREAS[trabajo.tipo])(trabajo)
+    except Exception as e:
+        ahora = timezone.now()
+        if not isinstance(e, ValueError) and trabajo.intentos < settings.TRABAJOS_INTENTOS:
+            espera = TRABAJOS_REINTENTO_BASE * 2 ** (trabajo.intentos - 1)
+            campos = {'estado': Trabajo.PENDIENTE, 'disponible_desde': ahora + timedelta(seconds=espera)}
+            logger.warning('Trabajo %s falló (intento %s), se reintenta en %s s: %s',
+                           trabajo.pk, trabajo.intentos, espera, e)
+        else:
+            campos = {'estado': Trabajo.FALLIDO, 'terminado_en': ahora}
+            logger.warning('Trabajo %s falló definitivamente: %s', trabajo.pk, e)
+        campos['error'] = str(e) or e.__class__.__name__
+    else:
+        campos = {
+            'estado': Trabajo.TERMINADO,
+            'resultado': resultado,
+            'archivo': archivo,
+            'error': '',
+            'terminado_en': timezone.now(),
+        }
+    # Si se lo consideró colgado y volvió a la cola, el resultado se descarta:
+    # ``intentos`` identifica el reclamo, así un intento viejo no pisa al nuevo.
+    Trabajo.objects.filter(pk=trabajo.pk, estado=Trabajo.EN_CURSO, intentos=trabajo.intentos).update(**campos)
+
+
+def mantenimiento():
+    """Devuelve a la cola los trabajos colgados y borra los viejos."""
+    ahora = timezone.now()
+    colgados = Trabajo.objects.filter(
+        estado=Trabajo.EN_CURSO, iniciado_en__lt=ahora - timedelta(seconds=TRABAJOS_TIMEOUT)
+    )
+    colgados.filter(intentos__gte=settings.TRABAJOS_INTENTOS).update(
+        estado=Trabajo.FALLIDO, error='Se agotó el tiempo de ejecución', terminado_en=ahora
+    )
+    colgados.update(estado=Trabajo.PENDIENTE, disponible_desde=ahora)
+    Trabajo.objects.filter(
+        estado__in=[Trabajo.TERMINADO, Trabajo.FALLIDO], terminado_en__lt=ahora - TRABAJOS_RETENCION
+    ).delete()
+
+
+def procesar_pendientes(tipos=None):
+    """Ejecuta en este hilo los trabajos disponibles hasta vaciar la cola; devuelve cuántos."""
+    procesados = 0
+    for tipo in tipos or TAREAS:
+        while (trabajo := reclamar(tipo)) is not None:
+            ejecutar(trabajo)
+            procesados += 1
+    return procesados
+
+
+class Ejecutor:
+    """Pool acotado de hilos que vacía la cola: ``concurrencia[tipo]`` hilos por tipo."""
+
+    def __init__(self, concurrencia):
+        self.concurrencia = {tipo: cantidad for tipo, cantidad in concurrencia.items() if tipo in TAREAS}
+        self._avisos = {tipo: threading.Event() for tipo in self.concurrencia}
+        self._detener = threading.Event()
+        self._hilos = []
+        self._mantenimiento_lock = threading.Lock()
+        self._ultimo_mantenimiento = 0.0
+
+    def iniciar(self):
+        for tipo, cantidad in self.concurrencia.items():
+            for n in range(cantidad):
+                hilo = threading.Thread(
+                    target=self._bucle, args=(tipo,), name=f'trabajos-{tipo}-{n}', daemon=True
+                )
+                hilo.start()
+                self._hilos.append(hilo)
+        return self
+
+    def despertar(self, tipo=None):
+        for clave, aviso in self._avisos.items():
+            if tipo is None or clave == tipo:
+                aviso.set()
+
+    def detener(self):
+        """Pide a los hilos que terminen y los espera (cada uno termina su trabajo actual)."""
+        self._detener.set()
+        self.despertar()
+        for hilo in self._hilos:
+            hilo.join()
+
+    def _mantener(self):
+        with self._mantenimiento_lock:
+            if time.monotonic() - self._ultimo_mantenimiento < TRABAJOS_TIMEOUT / 5:
+                return
+            self._ultimo_mantenimiento = time.monotonic()
+        mantenimiento()
+
+    def _bucle(self, tipo):
+        aviso = self._avisos[tipo]
+        try:
+            while not self._detener.is_set():
+                close_old_connections()
+                try:
+                    self._mantener()
+                    trabajo = reclamar(tipo)
+                    if trabajo is not None:
+                        ejecutar(trabajo)
+                        continue
+                except Exception:
+                    logger.exception('Error en el ejecutor de trabajos (%s)', tipo)
+                aviso.wait(TRABAJOS_ESPERA_OCIOSA)
+                aviso.clear()
+        finally:
+            connection.close()
+
+
+_ejecutor = None
+_ejecutor_lock = threading.Lock()
+
+
+def ejecutor():
+    """
+    El ejecutor de este proceso, que arranca con el primer trabajo encolado o
+    con la primera consulta de uno pendiente (los que quedaron de antes de un
+    reinicio).
+    """
+    global _ejecutor
+    with _ejecutor_lock:
+        if _ejecutor is None:
+            _ejecutor = Ejecutor(settings.TRABAJOS_CONCURRENCIA).iniciar()
+    return _ejecutor
@@ -7,5 +7,10 @@ urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('acm/', views.acm, name='acm'),
     path('acm/api/generar/', views.acm_generar, name='acm_generar'),
+    path('acm/api/generar/stream/', views.acm_generar_stream, name='acm_generar_stream'),
+    path('acm/api/comparables/', views.acm_comparables, name='acm_comparables'),
     path('acm/api/pdf/', views.acm_pdf, name='acm_pdf'),
+    path('acm/api/trabajos/', views.acm_trabajos, name='acm_trabajos'),
+    path('acm/api/trabajos/<uuid:pk>/', views.acm_trabajo, name='acm_trabajo'),
+    path('acm/api/trabajos/<uuid:pk>/pdf/', views.acm_trabajo_pdf, name='acm_trabajo_pdf'),
 ]
@@ -1,12 +1,26 @@
+import asyncio
 import json
 import datetime
+import time
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.shortcuts import redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse
-from django.http import HttpResponse, JsonResponse
+from django.utils.safestring import mark_safe
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
-from groq import Groq
+from groq import AsyncGroq, Groq
+
+from home import estadisticas
+
+from . import markdown, recursos, reportes, trabajos
+from .comparables import COMPARABLES_K, COMPARABLES_K_MAX, buscar_comparables
+from .models import Trabajo
+from .pdf import renderizar_pdf
+
+TRABAJO_ESPERA_MAX = 25  # segundos de long polling, por debajo del timeout del proxy
+TRABAJO_ESPERA_INTERVALO = 0.5
 
 
 def _require_plan(request):
@@ -19,6 +33,10 @@ def _require_plan(request):
     return None
 
 
+def _tiene_plan(user):
+    return user.is_authenticated and (user.is_staff or user.is_superuser or user.plan_activo)
+
+
 def dashboard(request):
     guard = _require_plan(request)
     if guard:
@@ -40,25 +58,117 @@ def acm_generar(request):
         return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
 
     try:
-        body = json.loads(request.body)
-        comparables = body.get('comparables', [])
-        sujeto = body.get('sujeto', {})
+        return JsonResponse({'ok': True, **generar_reporte(json.loads(request.body))})
 
-        if len(comparables) < 2 or len(comparables) > 3:
-            return JsonResponse({'ok': False, 'error': 'Se requieren 2 o 3 inmuebles comparables'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
 
-        prompt = _build_prompt(comparables, sujeto)
 
-        client = Groq(api_key=settings.GROQ_API_KEY)
-        completion = client.chat.completions.create(
-            model='llama-3.3-70b-versatile',
+@require_POST
+async def acm_generar_stream(request):
+    """
+    Como ``acm_generar`` pero devuelve el reporte como server-sent events a
+    medida que el modelo lo escribe: ``inicio`` (comparables y si viene de la
+    cache), ``texto`` (cada fragmento de Markdown), y ``fin`` o ``error``.
+    Es async: bajo ASGI la espera del modelo no ocupa un worker.
+    """
+    if not _tiene_plan(await request.auser()):
+        return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
+
+    try:
+        comparables, prompt, clave = await sync_to_async(_preparar_acm)(json.loads(request.body))
+        reporte = await reportes.aobtener(clave)
+    except ValueError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+
+    response = StreamingHttpResponse(
+        _eventos_acm(prompt, clave, comparables, reporte), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: no acumular la respuesta
+    return response
+
+
+def _preparar_acm(body):
+    """
+    Comparables, prompt y clave de cache de un pedido de ACM. Sin comparables
+    elegidos en el mapa, los elige el motor. Los comparables vuelven en el
+    orden del prompt (``reportes.ordenar``). La clave sale del prompt sin las
+    estadísticas de zona: recalcularlas no invalida los reportes ya
+    generados. ``ValueError`` si el pedido no alcanza.
+    """
+    comparables = body.get('comparables') or []
+    sujeto = body.get('sujeto', {})
+
+    if not comparables:
+        comparables = buscar_comparables(sujeto, k=COMPARABLES_K)
+        if len(comparables) < 2:
+            raise ValueError('No hay suficientes comparables publicados para este inmueble')
+    if len(comparables) < 2 or len(comparables) > 3:
+        raise ValueError('Se requieren 2 o 3 inmuebles comparables')
+
+    comparables = reportes.ordenar(comparables)
+    canonicos = reportes.normalizar(comparables, sujeto)
+    prompt = _build_prompt(*canonicos, estadisticas.para_sujeto(sujeto))
+    return comparables, prompt, reportes.clave(_build_prompt(*canonicos))
+
+
+def _sse(evento, datos):
+    return f'event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n'
+
+
+async def _eventos_acm(prompt, clave, comparables, reporte):
+    yield _sse('inicio', {'comparables': comparables, 'en_cache': reporte is not None})
+    if reporte is not None:
+        yield _sse('texto', {'texto': reporte})
+        yield _sse('fin', {})
+        return
+
+    partes = []
+    try:
+        client = AsyncGroq(api_key=settings.GROQ_API_KEY)
+        stream = await client.chat.completions.create(
+            model=reportes.ACM_MODELO,
             messages=[{'role': 'user', 'content': prompt}],
-            temperature=0.3,
-            max_tokens=3000,
+            temperature=reportes.ACM_TEMPERATURA,
+            max_tokens=reportes.ACM_MAX_TOKENS,
+            stream=True,
         )
-        reporte = completion.choices[0].message.content
-        return JsonResponse({'ok': True, 'reporte': reporte})
+        async with stream:  # cierra la conexión también si el cliente se va
+            async for chunk in stream:
+                texto = chunk.choices[0].delta.content if chunk.choices else None
+                if texto:
+                    partes.append(texto)
+                    yield _sse('texto', {'texto': texto})
+    except Exception as e:
+        yield _sse('error', {'error': str(e)})
+        return
+    # Solo un reporte completo entra a la cache (si el cliente se va, el
+    # generador se cancela antes de llegar acá).
+    await reportes.aguardar(clave, ''.join(partes))
+    yield _sse('fin', {})
+
+
+@require_POST
+def acm_comparables(request):
+    guard = _require_plan(request)
+    if guard:
+        return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
 
+    try:
+        body = json.loads(request.body)
+        k = int(body.get('k') or COMPARABLES_K)
+        if not 1 <= k <= COMPARABLES_K_MAX:
+            return JsonResponse({'ok': False, 'error': f'k debe estar entre 1 y {COMPARABLES_K_MAX}'}, status=400)
+        comparables = buscar_comparables(body.get('sujeto', {}), k=k)
+        return JsonResponse({'ok': True, 'comparables': comparables})
+
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'ok': False, 'error': str(e)}, status=500)
 
@@ -70,54 +180,182 @@ def acm_pdf(request):
         return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
 
     try:
-        body = json.loads(request.body)
-        comparables = body.get('comparables', [])
-        sujeto = body.get('sujeto', {})
-        reporte = body.get('reporte', '')
-
-        user = request.user
-        user_nombre = f'{user.first_name} {user.last_name}'.strip() or user.email
-        user_email = user.email
-        empresa_nombre = ''
-        try:
-            empresa_nombre = user.perfil.empresa.nombre
-        except Exception:
-            pass
-
-        fecha = datetime.date.today().strftime('%d/%m/%Y')
-
-        html = render_to_string('tools/acm_pdf_template.html', {
-            'comparables': comparables,
-            'sujeto': sujeto,
-            'reporte_json': json.dumps(reporte),
-            'user_nombre': user_nombre,
-            'user_email': user_email,
-            'empresa_nombre': empresa_nombre,
-            'fecha': fecha,
-        })
-
-        from playwright.sync_api import sync_playwright
-        with sync_playwright() as p:
-            browser = p.chromium.launch()
-            page = browser.new_page()
-            page.set_content(html, wait_until='networkidle')
-            pdf_bytes = page.pdf(
-                format='A4',
-                print_background=True,
-                margin={'top': '15mm', 'bottom': '15mm', 'left': '15mm', 'right': '15mm'},
-            )
-            browser.close()
-
-        filename = f"ACM_{datetime.date.today().strftime('%Y-%m-%d')}.pdf"
+        pdf_bytes = generar_pdf(json.loads(request.body), request.user)
         response = HttpResponse(pdf_bytes, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Content-Disposition'] = f'attachment; filename="{_nombre_pdf()}"'
         return response
 
     except Exception as e:
         return JsonResponse({'ok': False, 'error': str(e)}, status=500)
 
 
-def _build_prompt(comparables, sujeto):
+@require_POST
+def acm_trabajos(request):
+    """
+    Encola la generación de un reporte (``tipo: "acm"``, mismo cuerpo que
+    ``acm_generar``) o de un PDF (``tipo: "pdf"``, mismo cuerpo que
+    ``acm_pdf``) y responde 202 con el id; el resultado se consulta en
+    ``acm_trabajo``.
+    """
+    guard = _require_plan(request)
+    if guard:
+        return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
+
+    try:
+        body = json.loads(request.body)
+        if not isinstance(body, dict):
+            raise ValueError('El cuerpo debe ser un objeto JSON')
+        tipo = body.pop('tipo', 'acm')
+        if tipo not in trabajos.TAREAS:
+            return JsonResponse({'ok': False, 'error': f'Tipo de trabajo desconocido: {tipo}'}, status=400)
+        if trabajos.activos(request.user).count() >= settings.TRABAJOS_POR_USUARIO:
+            return JsonResponse(
+                {'ok': False, 'error': 'Ya hay trabajos en curso; espere a que terminen'}, status=429
+            )
+        trabajo = trabajos.encolar(tipo, request.user, body)
+        return JsonResponse(_trabajo_json(trabajo), status=202)
+
+    except ValueError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+
+
+async def acm_trabajo(request, pk):
+    """
+    Estado de un trabajo del usuario. Con ``?esperar=N`` (segundos, hasta
+    ``TRABAJO_ESPERA_MAX``) responde recién cuando termina o se cumple el
+    plazo (long polling); es async, así que esperar no ocupa un worker.
+    """
+    user = await request.auser()
+    if not _tiene_plan(user):
+        return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
+
+    consulta = Trabajo.objects.filter(pk=pk, usuario=user).defer('archivo')
+    trabajo = await consulta.afirst()
+    if trabajo is None:
+        return JsonResponse({'ok': False, 'error': 'Trabajo no encontrado'}, status=404)
+    if trabajo.estado == Trabajo.PENDIENTE and settings.TRABAJOS_EN_PROCESO:
+        # Tras un reinicio nadie encoló en este proceso: la consulta arranca el ejecutor.
+        trabajos.ejecutor().despertar(trabajo.tipo)
+    try:
+        esperar = min(float(request.GET.get('esperar') or 0), TRABAJO_ESPERA_MAX)
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'esperar debe ser numérico'}, status=400)
+    limite = time.monotonic() + esperar
+    while trabajo.estado in (Trabajo.PENDIENTE, Trabajo.EN_CURSO) and time.monotonic() < limite:
+        await asyncio.sleep(TRABAJO_ESPERA_INTERVALO)
+        trabajo = await consulta.afirst()
+    return JsonResponse(_trabajo_json(trabajo))
+
+
+def acm_trabajo_pdf(request, pk):
+    guard = _require_plan(request)
+    if guard:
+        return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
+
+    trabajo = Trabajo.objects.filter(
+        pk=pk, usuario=request.user, tipo='pdf', estado=Trabajo.TERMINADO
+    ).first()
+    if trabajo is None:
+        return JsonResponse({'ok': False, 'error': 'PDF no disponible'}, status=404)
+    response = HttpResponse(bytes(trabajo.archivo), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{trabajo.resultado["nombre"]}"'
+    return response
+
+
+def _trabajo_json(trabajo):
+    datos = {
+        'ok': trabajo.estado != Trabajo.FALLIDO,
+        'id': str(trabajo.pk),
+        'tipo': trabajo.tipo,
+        'estado': trabajo.estado,
+        'intentos': trabajo.intentos,
+        'url': reverse('tools:acm_trabajo', args=[trabajo.pk]),
+    }
+    if trabajo.estado == Trabajo.TERMINADO:
+        datos['resultado'] = trabajo.resultado
+        if trabajo.tipo == 'pdf':
+            datos['descarga'] = reverse('tools:acm_trabajo_pdf', args=[trabajo.pk])
+    elif trabajo.error:
+        datos['error'] = trabajo.error  # en un pendiente, el del último intento
+    return datos
+
+
+def generar_reporte(body):
+    """Reporte ACM de un pedido (de la cache si ya se generó uno igual)."""
+    comparables, prompt, clave = _preparar_acm(body)
+    reporte = reportes.obtener(clave)
+    en_cache = reporte is not None
+    if not en_cache:
+        client = Groq(api_key=settings.GROQ_API_KEY)
+        completion = client.chat.completions.create(
+            model=reportes.ACM_MODELO,
+            messages=[{'role': 'user', 'content': prompt}],
+            temperature=reportes.ACM_TEMPERATURA,
+            max_tokens=reportes.ACM_MAX_TOKENS,
+        )
+        reporte = completion.choices[0].message.content
+        reportes.guardar(clave, reporte)
+    return {'reporte': reporte, 'comparables': comparables, 'en_cache': en_cache}
+
+
+def generar_pdf(body, user):
+    comparables = body.get('comparables', [])
+    sujeto = body.get('sujeto', {})
+    reporte = body.get('reporte', '')
+
+    user_nombre = f'{user.first_name} {user.last_name}'.strip() or user.email
+    user_email = user.email
+    empresa_nombre = ''
+    try:
+        empresa_nombre = user.perfil.empresa.nombre
+    except Exception:
+        pass
+
+    fecha = datetime.date.today().strftime('%d/%m/%Y')
+
+    # Todo va incrustado en el HTML: el render no espera a la red. Las
+    # imágenes salen de la base por id, nunca de URLs que mande el cliente.
+    urls = recursos.imagenes_principales(c.get('id') for c in comparables)
+    imagenes = recursos.data_uris(urls.get(c.get('id')) for c in comparables)
+    comparables = [{**c, 'imagen_principal': imagen} for c, imagen in zip(comparables, imagenes)]
+
+    html = render_to_string('tools/acm_pdf_template.html', {
+        'comparables': comparables,
+        'sujeto': sujeto,
+        'reporte_secciones': [mark_safe(markdown.a_html(s)) for s in markdown.secciones(reporte)],
+        'logo': recursos.logo_data_uri(),
+        'fuentes_css': recursos.fuentes_css(),
+        'user_nombre': user_nombre,
+        'user_email': user_email,
+        'empresa_nombre': empresa_nombre,
+        'fecha': fecha,
+    })
+
+    return renderizar_pdf(html)
+
+
+def _nombre_pdf():
+    return f"ACM_{datetime.date.today().strftime('%Y-%m-%d')}.pdf"
+
+
+def tarea_acm(trabajo):
+    return generar_reporte(trabajo.datos), None
+
+
+def tarea_pdf(trabajo):
+    return {'nombre': _nombre_pdf()}, generar_pdf(trabajo.datos, trabajo.usuario)
+
+
+def _fmt_estadistica(e):
+    tendencia = 'sin mes anterior' if e.tendencia_pct is None else f'{e.tendencia_pct:+.1f}% vs. mes anterior'
+    return (
+        f"- {e.zona or 'Sin zona'}, {e.ciudad or 'N/D'} ({e.tipo_propiedad.nombre}, {e.tipo_transaccion.nombre}): "
+        f"{e.cantidad} publicaciones | mediana ${e.mediana_m2:,.0f} USD/m² "
+        f"(p25–p75: ${e.p25_m2:,.0f}–${e.p75_m2:,.0f}) | tendencia: {tendencia}"
+    )
+
+
+def _build_prompt(comparables, sujeto, mercado=()):
     def fmt_comp(c, idx):
         return f"""Comparable {idx}:
 - Título: {c.get('titulo', 'N/D')}
@@ -139,13 +377,20 @@ def _build_prompt(comparables, sujeto):
 - Precio del propietario: {('$' + str(sujeto.get('precio_propietario_usd')) + ' USD') if sujeto.get('precio_propietario_usd') else 'No especificado'}
 - Notas adicionales: {sujeto.get('notas', 'Ninguna')}""".strip()
 
+    mercado_text = ''
+    if mercado:
+        mercado_text = (
+            f"\n\nESTADÍSTICAS DEL MERCADO (USD/m² de publicaciones activas, {mercado[0].periodo:%m/%Y}):\n"
+            + '\n'.join(_fmt_estadistica(e) for e in mercado)
+        )
+
     return f"""Eres un perito inmobiliario certificado con amplia experiencia en el mercado boliviano (Santa Cruz, La Paz, Cochabamba). Genera un Análisis de Mercado Comparativo (AMC) profesional y detallado en español para el inmueble sujeto, basándote en los inmuebles comparables proporcionados.
 
 INMUEBLES COMPARABLES DEL MERCADO:
 {comps_text}
 
 INMUEBLE SUJETO A ANALIZAR:
-{sujeto_text}
+{sujeto_text}{mercado_text}
 
 Genera el AMC con las siguientes secciones en formato Markdown:
 
@@ -168,7 +413,7 @@ Rango mínimo-máximo justificado para el inmueble sujeto (en USD y BS) que la d
 Un precio específico de publicación con justificación, sin ser mayor al precio maximo.
 
 ## 7. Contexto de Mercado
-Breve análisis del mercado inmobiliario local en esa zona/ciudad.
+Breve análisis del mercado inmobiliario local en esa zona/ciudad (usa las estadísticas del mercado si están disponibles).
 
 ## 8. Conclusión y Recomendación
 Estrategia recomendada para el asesor (precio, puntos a negociar).